@@ -0,0 +1,36 @@
+"""
+Small asyncio helpers shared by the pipeline scripts.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Sequence, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+async def bounded_gather(
+    items: Sequence[T],
+    worker: Callable[[int, T], Awaitable[R]],
+    max_in_flight: int = 8,
+    return_exceptions: bool = True,
+) -> list[R | BaseException]:
+    """
+    Run `worker(idx, item)` for every item with at most `max_in_flight`
+    coroutines awaiting at once.
+
+    Results are returned in input order (not completion order). With
+    `return_exceptions=True` a failing item yields its exception in its slot
+    instead of cancelling the remaining work.
+    """
+    sem = asyncio.Semaphore(max(1, max_in_flight))
+
+    async def _run(idx: int, item: T) -> Any:
+        async with sem:
+            return await worker(idx, item)
+
+    return await asyncio.gather(
+        *(_run(i, item) for i, item in enumerate(items)),
+        return_exceptions=return_exceptions,
+    )
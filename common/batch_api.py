@@ -0,0 +1,184 @@
+"""
+Offline Batch-API mode
+----------------------
+For overnight sweeps latency does not matter, so instead of one synchronous
+`parse` call per request the runners can:
+
+1. serialise every request into a JSONL batch file (`/v1/chat/completions`
+   bodies with the strict json_schema `parse` would have sent)
+2. upload + submit it, then poll until the batch reaches a terminal state
+3. download the output file and rehydrate every line into its Pydantic
+   schema (`AuditResponse`, `FinalAuditReport`, `ContextSummaryOutput` …)
+
+Requests already present in a `ResponseCache` are answered locally and
+never submitted; fresh batch answers are written back into the cache.
+`common.batch_stub_server` speaks the same Files/Batches endpoints for
+offline runs (`OpenAI(base_url=...)`).
+"""
+from __future__ import annotations
+
+import datetime
+import json
+import pathlib
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from pydantic import BaseModel
+
+from common.llm_cache import CachedMessage, ResponseCache
+from common.schema_registry import response_format_param, validate_json
+
+ENDPOINT = "/v1/chat/completions"
+TERMINAL = {"completed", "failed", "expired", "cancelled"}
+FILE_API_RETRIES = 2        # Files / Batches calls run outside limited_call (pooled clients: 0)
+
+
+class BatchError(RuntimeError):
+    pass
+
+
+@dataclass
+class BatchRequest:
+    custom_id      : str
+    model          : str
+    messages       : list[dict]
+    response_format: type[BaseModel]
+    params         : dict = field(default_factory=dict)
+
+    def to_line(self) -> dict:
+        return {
+            "custom_id": self.custom_id,
+            "method": "POST",
+            "url": ENDPOINT,
+            "body": {
+                "model": self.model,
+                "messages": self.messages,
+                "response_format": response_format_param(self.response_format),
+                **self.params,
+            },
+        }
+
+
+def write_batch_file(requests: list[BatchRequest], path: str | pathlib.Path) -> pathlib.Path:
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        for req in requests:
+            f.write(json.dumps(req.to_line(), ensure_ascii=False) + "\n")
+    return path
+
+
+def submit_batch(client, path: pathlib.Path, metadata: dict | None = None):
+    with path.open("rb") as f:
+        uploaded = client.files.create(file=f, purpose="batch")
+    return client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint=ENDPOINT,
+        completion_window="24h",
+        metadata=metadata,
+    )
+
+
+def wait_for_batch(client, batch_id: str, poll_interval: float = 30.0, timeout: float | None = None):
+    start = time.time()
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        done = f"{counts.completed}/{counts.total}" if counts else "?"
+        print(f"⏳  batch {batch_id}: {batch.status} ({done})")
+        if batch.status in TERMINAL:
+            return batch
+        if timeout is not None and time.time() - start > timeout:
+            raise BatchError(f"batch {batch_id} still {batch.status} after {timeout:.0f}s")
+        time.sleep(poll_interval)
+
+
+def download_results(client, batch) -> dict[str, dict]:
+    """custom_id → output (or error) line."""
+    lines: dict[str, dict] = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for raw in client.files.content(file_id).text.splitlines():
+            if raw.strip():
+                line = json.loads(raw)
+                lines[line["custom_id"]] = line
+    return lines
+
+
+def rehydrate(line: dict | None, response_format: type[BaseModel]) -> CachedMessage:
+    """One output line → message with `.parsed` validated into `response_format`."""
+    if line is None:
+        raise BatchError("request missing from batch output")
+    if line.get("error"):
+        raise BatchError(str(line["error"]))
+    response = line.get("response") or {}
+    if response.get("status_code", 200) != 200:
+        raise BatchError(f"HTTP {response.get('status_code')}: {response.get('body')}")
+    body = response["body"]
+    choice = body["choices"][0]
+    # same guard as ResponseCache.from_completion: never validate / cache cut-off output
+    if choice.get("finish_reason") in ("length", "content_filter"):
+        raise BatchError(f"finish_reason={choice['finish_reason']}: output incomplete")
+    message = choice["message"]
+    content, refusal = message.get("content"), message.get("refusal")
+    parsed = None if refusal or not content else validate_json(response_format, content)
+    return CachedMessage(content=content, refusal=refusal, parsed=parsed, usage=body.get("usage"))
+
+
+def run_batch(
+    client,
+    requests: list[BatchRequest],
+    workdir: str | pathlib.Path = "logs/batches",
+    cache: ResponseCache | None = None,
+    poll_interval: float = 30.0,
+    timeout: float | None = None,
+    metadata: dict | None = None,
+) -> dict[str, CachedMessage | Exception]:
+    """Submit `requests` as one batch and return custom_id → message / exception."""
+    results: dict[str, CachedMessage | Exception] = {}
+    pending: list[BatchRequest] = []
+    keys: dict[str, str] = {}
+
+    for req in requests:
+        if cache is not None:
+            keys[req.custom_id] = key = cache.make_key(
+                req.model, req.messages, req.response_format, **req.params
+            )
+            hit = cache.get(key)
+            if hit is not None:
+                results[req.custom_id] = cache.decode(hit, req.response_format, cached=True)
+                continue
+        pending.append(req)
+
+    if not pending:
+        return results
+
+    client = client.with_options(max_retries=FILE_API_RETRIES)
+    # label + random suffix: concurrent runs within one second get their own files
+    ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    label = re.sub(r"[^\w.-]+", "_", pending[0].custom_id)[:40]
+    stem = f"batch_{label}_{ts}_{uuid.uuid4().hex[:8]}"
+    path = write_batch_file(pending, pathlib.Path(workdir) / f"{stem}.jsonl")
+    batch = submit_batch(client, path, metadata)
+    print(f"📤  submitted {len(pending)} request(s) as batch {batch.id} ({path})")
+    batch = wait_for_batch(client, batch.id, poll_interval, timeout)
+    if batch.status != "completed":
+        raise BatchError(f"batch {batch.id} ended as {batch.status}: {batch.errors}")
+
+    lines = download_results(client, batch)
+    (pathlib.Path(workdir) / f"{stem}_output.jsonl").write_text(
+        "".join(json.dumps(lines[k]) + "\n" for k in lines), encoding="utf-8"
+    )
+    for req in pending:
+        try:
+            message = rehydrate(lines.get(req.custom_id), req.response_format)
+        except Exception as e:
+            results[req.custom_id] = e
+            continue
+        if cache is not None:
+            cache.store(keys[req.custom_id], message)
+        results[req.custom_id] = message
+    return results
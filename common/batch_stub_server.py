@@ -0,0 +1,231 @@
+"""
+Local stand-in for the OpenAI Files + Batches endpoints
+-------------------------------------------------------
+Lets `common.batch_api` be exercised offline:
+
+    server = BatchStubServer().start()
+    client = OpenAI(api_key="stub", base_url=server.base_url)
+    ...
+    server.stop()
+
+or `python -m common.batch_stub_server --port 8765` from the repo root.
+
+• POST /v1/files, GET /v1/files/{id}/content
+• POST /v1/batches, GET /v1/batches/{id}, POST /v1/batches/{id}/cancel
+• a batch reports `in_progress` for `polls_until_done` retrievals, then
+  `completed`; every request line is answered by `responder(body) -> str`
+  (default: a minimal instance of the request's json_schema)
+"""
+from __future__ import annotations
+
+import argparse
+import email.parser
+import email.policy
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+
+Responder = Callable[[dict], str]
+
+
+def example_from_schema(schema: dict, root: dict | None = None) -> Any:
+    """Smallest value that satisfies a (strict, OpenAI-style) JSON schema."""
+    root = root or schema
+    if "$ref" in schema:
+        name = schema["$ref"].rsplit("/", 1)[-1]
+        return example_from_schema(root.get("$defs", {})[name], root)
+    if "const" in schema:
+        return schema["const"]
+    if "enum" in schema:
+        return schema["enum"][0]
+    for key in ("anyOf", "oneOf"):
+        if key in schema:
+            options = [s for s in schema[key] if s.get("type") != "null"] or schema[key]
+            return example_from_schema(options[0], root)
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != "null"), "null")
+    if kind == "object":
+        return {k: example_from_schema(v, root) for k, v in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [example_from_schema(schema.get("items", {}), root)] * schema.get("minItems", 0)
+    return {"string": "", "integer": 0, "number": 0, "boolean": False}.get(kind)
+
+
+def schema_responder(body: dict) -> str:
+    fmt = body.get("response_format") or {}
+    schema = (fmt.get("json_schema") or {}).get("schema")
+    return json.dumps(example_from_schema(schema)) if schema else "{}"
+
+
+class _Store:
+    def __init__(self, responder: Responder, polls_until_done: int):
+        self.responder = responder
+        self.polls_until_done = polls_until_done
+        self.files: dict[str, dict] = {}
+        self.batches: dict[str, dict] = {}
+        self.polls: dict[str, int] = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def new_id(self, prefix: str) -> str:
+        return f"{prefix}-stub{next(self.ids)}"
+
+    def add_file(self, filename: str, purpose: str, data: bytes) -> dict:
+        file_id = self.new_id("file")
+        meta = {
+            "id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+            "filename": filename, "purpose": purpose, "status": "processed",
+        }
+        self.files[file_id] = {"meta": meta, "data": data}
+        return meta
+
+    def add_batch(self, req: dict) -> dict:
+        batch_id = self.new_id("batch")
+        n = len(self.files[req["input_file_id"]]["data"].splitlines())
+        batch = {
+            "id": batch_id, "object": "batch", "endpoint": req["endpoint"],
+            "input_file_id": req["input_file_id"], "completion_window": req["completion_window"],
+            "status": "validating", "created_at": int(time.time()), "metadata": req.get("metadata"),
+            "output_file_id": None, "error_file_id": None,
+            "request_counts": {"total": n, "completed": 0, "failed": 0},
+        }
+        self.batches[batch_id] = batch
+        self.polls[batch_id] = 0
+        return batch
+
+    def advance(self, batch_id: str) -> dict:
+        batch = self.batches[batch_id]
+        if batch["status"] in ("completed", "cancelled"):
+            return batch
+        self.polls[batch_id] += 1
+        if self.polls[batch_id] <= self.polls_until_done:
+            batch["status"] = "in_progress"
+            return batch
+        self._complete(batch)
+        return batch
+
+    def _complete(self, batch: dict) -> None:
+        out, failed = [], 0
+        for raw in self.files[batch["input_file_id"]]["data"].decode("utf-8").splitlines():
+            if not raw.strip():
+                continue
+            line = json.loads(raw)
+            body = line["body"]
+            try:
+                content = self.responder(body)
+                response = {"status_code": 200, "request_id": self.new_id("req"), "body": {
+                    "id": self.new_id("chatcmpl"), "object": "chat.completion",
+                    "created": int(time.time()), "model": body.get("model"),
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {
+                        "role": "assistant", "content": content, "refusal": None}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                }}
+                out.append({"id": self.new_id("batch_req"), "custom_id": line["custom_id"],
+                            "response": response, "error": None})
+            except Exception as e:
+                failed += 1
+                out.append({"id": self.new_id("batch_req"), "custom_id": line["custom_id"],
+                            "response": None, "error": {"code": "stub_error", "message": str(e)}})
+        data = "".join(json.dumps(o) + "\n" for o in out).encode("utf-8")
+        output = self.add_file(f"{batch['id']}_output.jsonl", "batch_output", data)
+        batch.update(
+            status="completed", output_file_id=output["id"], completed_at=int(time.time()),
+            request_counts={"total": len(out), "completed": len(out) - failed, "failed": failed},
+        )
+
+
+def _handler(store: _Store):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):              # no per-request access log
+            pass
+
+        def _send(self, status: int, payload: Any, raw: bool = False):
+            data = payload if raw else json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/octet-stream" if raw else "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def do_POST(self):
+            with store.lock:
+                if self.path == "/v1/files":
+                    return self._upload()
+                if self.path == "/v1/batches":
+                    return self._send(200, store.add_batch(json.loads(self._body())))
+                m = re.fullmatch(r"/v1/batches/([^/]+)/cancel", self.path)
+                if m and m.group(1) in store.batches:
+                    store.batches[m.group(1)]["status"] = "cancelled"
+                    return self._send(200, store.batches[m.group(1)])
+            self._send(404, {"error": {"message": f"no route {self.path}"}})
+
+        def do_GET(self):
+            with store.lock:
+                m = re.fullmatch(r"/v1/batches/([^/]+)", self.path)
+                if m and m.group(1) in store.batches:
+                    return self._send(200, store.advance(m.group(1)))
+                m = re.fullmatch(r"/v1/files/([^/]+)/content", self.path)
+                if m and m.group(1) in store.files:
+                    return self._send(200, store.files[m.group(1)]["data"], raw=True)
+            self._send(404, {"error": {"message": f"no route {self.path}"}})
+
+        def _upload(self):
+            head = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode()
+            msg = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(head + self._body())
+            fields, filename, data = {}, "upload.jsonl", b""
+            for part in msg.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                if name == "file":
+                    filename = part.get_filename() or filename
+                    data = part.get_payload(decode=True)
+                else:
+                    fields[name] = part.get_content().strip()
+            self._send(200, store.add_file(filename, fields.get("purpose", "batch"), data))
+
+    return Handler
+
+
+class BatchStubServer:
+    def __init__(
+        self,
+        responder: Responder = schema_responder,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        polls_until_done: int = 1,
+    ):
+        self.store = _Store(responder, polls_until_done)
+        self.httpd = ThreadingHTTPServer((host, port), _handler(self.store))
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "BatchStubServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--polls", type=int, default=1, help="in_progress polls before completion")
+    args = ap.parse_args()
+    server = BatchStubServer(host=args.host, port=args.port, polls_until_done=args.polls)
+    print(f"Batch stub listening on {server.base_url}")
+    server.httpd.serve_forever()
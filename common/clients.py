@@ -0,0 +1,167 @@
+"""
+Process-wide LLM client registry
+--------------------------------
+One pooled client per (provider, sync/async, api key, base url) instead of a
+fresh `OpenAI()` / `httpx.AsyncClient` per module or per call, so requests
+reuse keep-alive connections and skip the TLS handshake.
+
+• pool limits / timeouts are tunable with `configure(...)` before first use
+• HTTP/2 is enabled when the optional `h2` package is installed
+• every response's rate-limit headers feed `common.rate_limit`
+• SDK retries are off (`max_retries=0`): calls go through
+  `common.rate_limit.limited_call`, which owns retry / backoff
+• async clients are bound to the event loop that first uses them: create and
+  use them inside one `asyncio.run(...)` and `await aclose_all()` before it
+  returns; sync clients are closed at interpreter exit
+"""
+from __future__ import annotations
+
+import asyncio
+import atexit
+import importlib.util
+import os
+from dataclasses import dataclass, replace
+from typing import Any
+
+import httpx
+
+from common.rate_limit import observe_response
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    max_connections: int = 50
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60.0
+    timeout: float = 300.0              # 5 minutes total
+    connect_timeout: float = 10.0
+    http2: bool = importlib.util.find_spec("h2") is not None
+
+
+_config = PoolConfig()
+_sync: dict[tuple, Any] = {}
+_async: dict[tuple, Any] = {}
+
+
+def configure(**overrides) -> PoolConfig:
+    """Change pool settings; only affects clients created afterwards."""
+    global _config
+    _config = replace(_config, **overrides)
+    return _config
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=_config.max_connections,
+        max_keepalive_connections=_config.max_keepalive_connections,
+        keepalive_expiry=_config.keepalive_expiry,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(_config.timeout, connect=_config.connect_timeout)
+
+
+async def _aobserve(response: httpx.Response) -> None:
+    observe_response(response)
+
+
+def _http() -> httpx.Client:
+    return httpx.Client(
+        limits=_limits(), timeout=_timeout(), http2=_config.http2,
+        event_hooks={"response": [observe_response]},
+    )
+
+
+def _ahttp() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=_limits(), timeout=_timeout(), http2=_config.http2,
+        event_hooks={"response": [_aobserve]},
+    )
+
+
+def _loop_id() -> int | None:
+    try:
+        return id(asyncio.get_running_loop())
+    except RuntimeError:
+        return None
+
+
+# ───────────────────────────── OpenAI ─────────────────────────────
+def get_openai(api_key: str | None = None, base_url: str | None = None):
+    from openai import OpenAI
+
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    key = ("openai", api_key, base_url)
+    if key not in _sync:
+        _sync[key] = OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=_http(),
+            max_retries=0,              # limited_call retries
+        )
+    return _sync[key]
+
+
+def get_async_openai(api_key: str | None = None, base_url: str | None = None):
+    from openai import AsyncOpenAI
+
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    key = ("openai", api_key, base_url, _loop_id())
+    if key not in _async:
+        _async[key] = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=_ahttp(),
+            max_retries=0,              # limited_call retries
+        )
+    return _async[key]
+
+
+# ──────────────────────────── Anthropic ───────────────────────────
+def get_async_anthropic(api_key: str | None = None):
+    from anthropic import AsyncAnthropic
+
+    api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+    key = ("anthropic", api_key, None, _loop_id())
+    if key not in _async:
+        _async[key] = AsyncAnthropic(
+            api_key=api_key,
+            http_client=_ahttp(),
+            max_retries=0,              # limited_call retries
+        )
+    return _async[key]
+
+
+def get_instructor_claude(api_key: str | None = None):
+    """Pooled AsyncAnthropic wrapped by instructor (reasoning-tools mode)."""
+    import instructor
+
+    api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+    key = ("instructor-anthropic", api_key, None, _loop_id())
+    if key not in _async:
+        _async[key] = instructor.from_anthropic(
+            get_async_anthropic(api_key), mode=instructor.Mode.ANTHROPIC_REASONING_TOOLS
+        )
+    return _async[key]
+
+
+# ──────────────────────────── shutdown ────────────────────────────
+async def aclose_all() -> None:
+    """Close every async client (call from inside the loop that used them)."""
+    clients = list(_async.items())
+    _async.clear()
+    for key, client in clients:
+        if key[0].startswith("instructor"):
+            continue                    # wraps an AsyncAnthropic closed below
+        await client.close()
+
+
+def close_all() -> None:
+    clients = list(_sync.values())
+    _sync.clear()
+    for client in clients:
+        client.close()
+
+
+atexit.register(close_all)
@@ -0,0 +1,227 @@
+"""
+Content-addressed LLM response cache
+------------------------------------
+• key   = sha256 over (model, messages, response_format JSON schema, sampling
+          params such as temperature / reasoning_effort)
+• value = one small JSON file per key under `root` (raw validated content);
+  truncated / filtered / invalid output and refusals are never stored
+• size-bounded: least-recently-used entries (by file mtime, touched on every
+  hit) are evicted once the directory grows past `max_bytes`
+• misses go out through `common.rate_limit`, so hits never spend budget
+• schemas, request params and validation come from `common.schema_registry`:
+  built once per process, raw JSON validated straight into the model
+• modes : "readwrite" (default) – serve hits, call + store on miss
+          "replay"              – serve hits, raise `CacheMiss` on miss, never write
+          "off"                 – bypass entirely
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+from dataclasses import dataclass
+from typing import Any
+
+from openai import ContentFilterFinishReasonError, LengthFinishReasonError
+from pydantic import BaseModel
+
+from common.rate_limit import estimate_tokens, limited_call, limited_call_sync
+from common.schema_registry import json_schema, response_format_param, validate_json
+
+DEFAULT_DIR = pathlib.Path(__file__).resolve().parents[1] / ".llm_cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+MODES = ("readwrite", "replay", "off")
+
+
+class CacheMiss(KeyError):
+    """Raised in replay mode when a request has never been recorded."""
+
+
+@dataclass
+class CachedMessage:
+    """Subset of the SDK's parsed chat message the pipeline scripts read."""
+    content: str | None
+    refusal: str | None = None
+    parsed : BaseModel | None = None
+    cached : bool = False
+    usage  : Any = None                 # provider usage of the live call, None on a hit
+
+
+def structured(response_format: Any) -> Any:
+    """`response_format` request param: registry-built for pydantic types, else as given."""
+    if isinstance(response_format, type) and issubclass(response_format, BaseModel):
+        return response_format_param(response_format)
+    return response_format
+
+
+def schema_of(response_format: Any) -> Any:
+    if response_format is None:
+        return None
+    if isinstance(response_format, type) and issubclass(response_format, BaseModel):
+        return json_schema(response_format)
+    return response_format                # already a dict / json_schema spec
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        root: str | os.PathLike = DEFAULT_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        mode: str = "readwrite",
+    ):
+        if mode not in MODES:
+            raise ValueError(f"cache mode must be one of {MODES}, got {mode!r}")
+        self.root = pathlib.Path(root)
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = self.misses = 0
+        self._size: int | None = None
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        """`LLM_CACHE` (mode), `LLM_CACHE_DIR`, `LLM_CACHE_MAX_MB`."""
+        return cls(
+            root=os.getenv("LLM_CACHE_DIR", DEFAULT_DIR),
+            max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", DEFAULT_MAX_BYTES / 2**20)) * 2**20),
+            mode=os.getenv("LLM_CACHE", "readwrite"),
+        )
+
+    # ───────────────────────── keying ─────────────────────────
+    @staticmethod
+    def make_key(model: str, messages: list[dict], response_format: Any = None, **params) -> str:
+        blob = json.dumps(
+            {
+                "model": model,
+                "messages": messages,
+                "schema": schema_of(response_format),
+                "params": params,
+            },
+            sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str,
+        )
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    # ───────────────────────── storage ────────────────────────
+    def get(self, key: str) -> dict | None:
+        if self.mode == "off":
+            return None
+        path = self._path(key)
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            if self.mode == "replay":
+                raise CacheMiss(key)
+            return None
+        if self.mode == "readwrite":
+            os.utime(path)                 # LRU touch
+        self.hits += 1
+        return payload
+
+    def put(self, key: str, payload: dict) -> None:
+        if self.mode != "readwrite":
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        old = path.stat().st_size if path.exists() else 0
+        size = self._current_size()        # measured before the new file lands (not counted twice)
+        os.replace(tmp, path)
+        self._size = size + len(data) - old
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _current_size(self) -> int:
+        if self._size is None:
+            self._size = sum(p.stat().st_size for p in self.root.glob("*/*.json"))
+        return self._size
+
+    def _evict(self) -> None:
+        """Drop least-recently-used entries until we are at 90 % of the bound."""
+        entries = sorted(
+            ((p.stat().st_mtime, p.stat().st_size, p) for p in self.root.glob("*/*.json")),
+            key=lambda e: e[0],
+        )
+        target = int(self.max_bytes * 0.9)
+        size = sum(e[1] for e in entries)
+        for _, nbytes, path in entries:
+            if size <= target:
+                break
+            path.unlink(missing_ok=True)
+            size -= nbytes
+        self._size = size
+
+    def stats(self) -> str:
+        return f"cache[{self.mode}] hits={self.hits} misses={self.misses}"
+
+    # ──────────────────── structured-output calls ──────────────────
+    @staticmethod
+    def decode(payload: dict, response_format: Any, cached: bool) -> CachedMessage:
+        content, refusal = payload.get("content"), payload.get("refusal")
+        parsed = None
+        if content and not refusal and isinstance(response_format, type) \
+                and issubclass(response_format, BaseModel):
+            parsed = validate_json(response_format, content)
+        return CachedMessage(content=content, refusal=refusal, parsed=parsed, cached=cached)
+
+    @classmethod
+    def from_completion(cls, completion: Any, response_format: Any) -> CachedMessage:
+        """
+        Live `chat.completions.create` result → message validated like a cache
+        hit. Raises like the SDK's `parse` on truncated / filtered output and on
+        JSON that does not fit `response_format`, so callers never cache those.
+        """
+        choice = completion.choices[0]
+        if choice.finish_reason == "length":
+            raise LengthFinishReasonError(completion=completion)
+        if choice.finish_reason == "content_filter":
+            raise ContentFilterFinishReasonError()
+        message = cls.decode(cls.encode(choice.message), response_format, cached=False)
+        message.usage = completion.usage
+        return message
+
+    def store(self, key: str, message: CachedMessage) -> None:
+        """Cache a fresh, validated message; refusals are returned but not cached (may be transient)."""
+        if not message.refusal:
+            self.put(key, self.encode(message))
+
+    @staticmethod
+    def encode(message: Any) -> dict:
+        return {"content": message.content, "refusal": getattr(message, "refusal", None)}
+
+    def parse(self, client, *, model: str, messages: list[dict], response_format: Any, **params) -> CachedMessage:
+        """
+        Structured-output completion (what `beta.chat.completions.parse` does),
+        served from cache when possible. Live calls send the registry's
+        precomputed schema and validate the raw JSON through it.
+        """
+        key = self.make_key(model, messages, response_format, **params)
+        payload = self.get(key)
+        if payload is not None:
+            return self.decode(payload, response_format, cached=True)
+        completion = limited_call_sync(model, lambda: client.chat.completions.create(
+            model=model, messages=messages, response_format=structured(response_format), **params
+        ), tokens=estimate_tokens(messages))
+        message = self.from_completion(completion, response_format)   # raises before anything is cached
+        self.store(key, message)
+        return message
+
+    async def aparse(self, client, *, model: str, messages: list[dict], response_format: Any, **params) -> CachedMessage:
+        """Async twin of `parse` for AsyncOpenAI clients."""
+        key = self.make_key(model, messages, response_format, **params)
+        payload = self.get(key)
+        if payload is not None:
+            return self.decode(payload, response_format, cached=True)
+        completion = await limited_call(model, lambda: client.chat.completions.create(
+            model=model, messages=messages, response_format=structured(response_format), **params
+        ), tokens=estimate_tokens(messages))
+        message = self.from_completion(completion, response_format)   # raises before anything is cached
+        self.store(key, message)
+        return message
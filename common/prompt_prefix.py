@@ -0,0 +1,93 @@
+"""
+Provider prompt-prefix caching helpers
+--------------------------------------
+Both providers only reuse a cached prefix when the leading messages are
+byte-identical between requests, so runners build the static part (task
+prompt, rulebook, numbered contract …) exactly once and append the
+per-item content last.
+
+• `with_prefix`       : static prefix + dynamic tail, prefix never mutated
+• `add_cache_control` : Anthropic `cache_control` breakpoints on the prefix
+• `PromptCacheUsage`  : per-run cached vs. uncached input-token accounting
+"""
+from __future__ import annotations
+
+import copy
+from typing import Any, Sequence
+
+# Anthropic accepts at most 4 cache breakpoints per request.
+MAX_BREAKPOINTS = 4
+
+
+def with_prefix(static_prefix: Sequence[dict], *dynamic: dict) -> list[dict]:
+    return [*static_prefix, *dynamic]
+
+
+def add_cache_control(messages: list[dict], n_static: int) -> list[dict]:
+    """
+    Return a copy of `messages` where the last block of the last static
+    message carries `cache_control: ephemeral`, so everything up to and
+    including it is cached by Anthropic. `n_static` counts leading messages.
+    Earlier breakpoints already present are kept (up to MAX_BREAKPOINTS).
+    """
+    if n_static <= 0:
+        return messages
+    out = copy.deepcopy(messages)
+    msg = out[n_static - 1]
+    content = msg["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    existing = sum(
+        1 for m in out if isinstance(m["content"], list)
+        for block in m["content"] if "cache_control" in block
+    )
+    if existing < MAX_BREAKPOINTS:
+        content[-1] = {**content[-1], "cache_control": {"type": "ephemeral"}}
+    msg["content"] = content
+    return out
+
+
+def _get(obj: Any, name: str) -> Any:
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+class PromptCacheUsage:
+    """Accumulates input-token usage across the calls of one run."""
+
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0           # everything billed as input
+        self.cached_tokens = 0          # served from the provider prefix cache
+        self.cache_write_tokens = 0     # Anthropic cache creation
+
+    def record(self, usage: Any) -> None:
+        """Accept an OpenAI `CompletionUsage` or an Anthropic `Usage` (or dicts)."""
+        if usage is None:
+            return
+        self.calls += 1
+        if _get(usage, "prompt_tokens") is not None:                     # OpenAI
+            self.input_tokens += _get(usage, "prompt_tokens") or 0
+            details = _get(usage, "prompt_tokens_details")
+            self.cached_tokens += _get(details, "cached_tokens") or 0
+        else:                                                           # Anthropic
+            read = _get(usage, "cache_read_input_tokens") or 0
+            write = _get(usage, "cache_creation_input_tokens") or 0
+            self.input_tokens += (_get(usage, "input_tokens") or 0) + read + write
+            self.cached_tokens += read
+            self.cache_write_tokens += write
+
+    @property
+    def uncached_tokens(self) -> int:
+        return self.input_tokens - self.cached_tokens
+
+    def report(self) -> str:
+        share = (self.cached_tokens / self.input_tokens * 100) if self.input_tokens else 0.0
+        line = (f"prompt cache: {self.calls} call(s), input {self.input_tokens} tok – "
+                f"cached {self.cached_tokens} ({share:.1f}%), uncached {self.uncached_tokens}")
+        if self.cache_write_tokens:
+            line += f", cache writes {self.cache_write_tokens}"
+        return line
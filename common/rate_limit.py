@@ -0,0 +1,298 @@
+"""
+Adaptive per-model rate limiter
+-------------------------------
+One pair of token buckets per model, requests-per-minute and
+tokens-per-minute, shared by every sync / async caller in the process.
+
+• a call reserves 1 request + its estimated tokens before it is sent and
+  waits only as long as the buckets need to refill (no blind sleeps)
+• `observe_response` reads the provider's rate-limit headers
+  (`x-ratelimit-*` for OpenAI, `anthropic-ratelimit-*` for Anthropic) and
+  resizes / drains the buckets to what the server reports; `common.clients`
+  hooks it into every pooled HTTP client
+• a 429 pauses the model for `retry-after` (or an exponential backoff with
+  full jitter) and the call is retried up to `MAX_RETRIES` times
+• transient failures the SDKs would retry themselves (connection errors,
+  timeouts, 408 / 409 / 5xx) are retried here too, backing off only the one
+  call; pooled clients are built with `max_retries=0`, so this loop is the
+  only retry layer
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_RPM = 500
+DEFAULT_TPM = 200_000
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0                      # seconds, doubled per attempt
+BACKOFF_CAP = 60.0
+
+_MODEL_RE = re.compile(rb'"model"\s*:\s*"([^"]+)"')
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+# ─────────────────────────── buckets ────────────────────────────
+@dataclass
+class TokenBucket:
+    """`capacity` units, refilled continuously at `capacity` per minute."""
+    capacity: float
+    level   : float = -1.0
+    stamp   : float = 0.0
+
+    def __post_init__(self):
+        if self.level < 0:
+            self.level = self.capacity
+        self.stamp = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.capacity / 60.0)
+        self.stamp = now
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until `amount` is available (amount is clipped to capacity)."""
+        missing = min(amount, self.capacity) - self.level
+        return 0.0 if missing <= 0 else missing * 60.0 / self.capacity
+
+
+class RateLimiter:
+    def __init__(self, model: str, rpm: float = DEFAULT_RPM, tpm: float = DEFAULT_TPM):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self.throttled = 0              # 429s seen
+        self.waited = 0.0               # seconds spent waiting for budget
+        self._lock = threading.Lock()
+
+    # ───────────────────── reservation ─────────────────────
+    def _reserve(self, tokens: int) -> float:
+        """Take the budget and return 0, or return how long to wait first."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            wait = max(self.requests.wait_for(1), self.tokens.wait_for(tokens))
+            if wait > 0:
+                return wait
+            self.requests.level -= 1
+            self.tokens.level -= min(tokens, self.tokens.capacity)
+            return 0.0
+
+    async def acquire(self, tokens: int = 0) -> None:
+        while (wait := self._reserve(tokens)) > 0:
+            self.waited += wait
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, tokens: int = 0) -> None:
+        while (wait := self._reserve(tokens)) > 0:
+            self.waited += wait
+            time.sleep(wait)
+
+    def settle(self, reserved: int, used: int | None) -> None:
+        """Give back (or charge) the difference between estimate and real usage."""
+        if used is None:
+            return
+        with self._lock:
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + reserved - used)
+
+    # ─────────────────────── feedback ──────────────────────
+    def update(self, bucket: str, limit: float | None, remaining: float | None) -> None:
+        with self._lock:
+            b: TokenBucket = getattr(self, bucket)
+            b.refill(time.monotonic())
+            if limit:
+                b.capacity = float(limit)
+            if remaining is not None:
+                b.level = min(b.level, float(remaining), b.capacity)
+
+    def pause(self, seconds: float, count: bool = True) -> None:
+        with self._lock:
+            self.throttled += count
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.requests.level = min(self.requests.level, 0.0)
+
+    def report(self) -> str:
+        return (f"rate[{self.model}] rpm={self.requests.capacity:.0f} "
+                f"tpm={self.tokens.capacity:.0f} waited={self.waited:.1f}s 429s={self.throttled}")
+
+
+_limiters: dict[str, RateLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def limiter_for(model: str) -> RateLimiter:
+    with _registry_lock:
+        if model not in _limiters:
+            _limiters[model] = RateLimiter(model)
+        return _limiters[model]
+
+
+def set_limits(model: str, rpm: float | None = None, tpm: float | None = None) -> RateLimiter:
+    """Seed a model's budget (e.g. your account tier) before the first call."""
+    limiter = limiter_for(model)
+    limiter.update("requests", rpm, rpm)
+    limiter.update("tokens", tpm, tpm)
+    return limiter
+
+
+# ──────────────────────────── headers ───────────────────────────
+def _duration(value: str | None) -> float | None:
+    """'20ms' / '1s' / '6m0s' (OpenAI) or an RFC 3339 timestamp (Anthropic)."""
+    if not value:
+        return None
+    parts = _DURATION_RE.findall(value)
+    if parts and "T" not in value:
+        return sum(float(n) * _UNIT[u] for n, u in parts)
+    try:
+        reset = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(0.0, (reset - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+def _num(headers, name: str) -> float | None:
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def retry_after(headers) -> float | None:
+    if headers is None:
+        return None
+    ms = _num(headers, "retry-after-ms")
+    if ms is not None:
+        return ms / 1000
+    return _num(headers, "retry-after") or _duration(headers.get("retry-after"))
+
+
+def apply_headers(limiter: RateLimiter, headers) -> None:
+    for bucket, openai, anthropic in (
+        ("requests", "requests", "requests"),
+        ("tokens",   "tokens",   "input-tokens"),
+    ):
+        limit = _num(headers, f"x-ratelimit-limit-{openai}")
+        remaining = _num(headers, f"x-ratelimit-remaining-{openai}")
+        if limit is None:
+            limit = _num(headers, f"anthropic-ratelimit-{anthropic}-limit")
+            remaining = _num(headers, f"anthropic-ratelimit-{anthropic}-remaining")
+        if limit is not None or remaining is not None:
+            limiter.update(bucket, limit, remaining)
+
+
+def observe_response(response) -> None:
+    """httpx response hook: feed rate-limit headers back into the model's limiter."""
+    try:
+        match = _MODEL_RE.search(response.request.content)
+    except Exception:                   # streamed / multipart upload body
+        return
+    if not match:
+        return
+    limiter = limiter_for(match.group(1).decode())
+    apply_headers(limiter, response.headers)
+    if response.status_code == 429:
+        limiter.pause(retry_after(response.headers) or BACKOFF_BASE)
+
+
+# ─────────────────────────── calling ────────────────────────────
+def estimate_tokens(messages: Any, max_output: int = 0) -> int:
+    """Cheap upper-bound-ish estimate (~4 chars per token) used for reservation."""
+    text = messages if isinstance(messages, str) else json.dumps(messages, default=str)
+    return math.ceil(len(text) / 4) + max_output
+
+
+def backoff_delay(attempt: int, hint: float | None = None) -> float:
+    """Full-jitter exponential backoff; a server `retry-after` hint wins."""
+    if hint:
+        return hint + random.uniform(0, BACKOFF_BASE)
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def _is_rate_limited(exc: BaseException) -> bool:
+    return getattr(exc, "status_code", None) == 429
+
+
+def _is_transient(exc: BaseException) -> bool:
+    """What the OpenAI / Anthropic SDKs retry: connection errors, timeouts, 408, 409, 5xx."""
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in (408, 409) or status >= 500
+    return any(c.__name__ == "APIConnectionError" for c in type(exc).__mro__)
+
+
+def _used_tokens(result: Any) -> int | None:
+    usage = getattr(result, "usage", None)
+    if usage is None:
+        usage = getattr(getattr(result, "_raw_response", None), "usage", None)
+    if usage is None:
+        return None
+    total = getattr(usage, "total_tokens", None)
+    if total is not None:
+        return total
+    return (getattr(usage, "input_tokens", 0) or 0) + (getattr(usage, "output_tokens", 0) or 0)
+
+
+async def limited_call(
+    model: str, call: Callable[[], Awaitable[T]], tokens: int = 0, max_retries: int = MAX_RETRIES,
+) -> T:
+    """Await `call()` within the model's budget, retrying 429s / transient errors with jittered backoff."""
+    limiter = limiter_for(model)
+    for attempt in range(max_retries + 1):
+        await limiter.acquire(tokens)
+        try:
+            result = await call()
+        except Exception as e:
+            if attempt == max_retries or not (_is_rate_limited(e) or _is_transient(e)):
+                raise
+            delay = backoff_delay(attempt, retry_after(getattr(getattr(e, "response", None), "headers", None)))
+            if _is_rate_limited(e):
+                print(f"⏳  429 from {model}, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+                limiter.pause(delay, count=False)    # the response hook already counted it
+            else:
+                print(f"⏳  {type(e).__name__} from {model}, retrying in {delay:.1f}s "
+                      f"(attempt {attempt + 1}/{max_retries})")
+                await asyncio.sleep(delay)
+            continue
+        limiter.settle(tokens, _used_tokens(result))
+        return result
+    raise AssertionError("unreachable")
+
+
+def limited_call_sync(
+    model: str, call: Callable[[], T], tokens: int = 0, max_retries: int = MAX_RETRIES,
+) -> T:
+    """Blocking twin of `limited_call`."""
+    limiter = limiter_for(model)
+    for attempt in range(max_retries + 1):
+        limiter.acquire_sync(tokens)
+        try:
+            result = call()
+        except Exception as e:
+            if attempt == max_retries or not (_is_rate_limited(e) or _is_transient(e)):
+                raise
+            delay = backoff_delay(attempt, retry_after(getattr(getattr(e, "response", None), "headers", None)))
+            if _is_rate_limited(e):
+                print(f"⏳  429 from {model}, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+                limiter.pause(delay, count=False)    # the response hook already counted it
+            else:
+                print(f"⏳  {type(e).__name__} from {model}, retrying in {delay:.1f}s "
+                      f"(attempt {attempt + 1}/{max_retries})")
+                time.sleep(delay)
+            continue
+        limiter.settle(tokens, _used_tokens(result))
+        return result
+    raise AssertionError("unreachable")
@@ -0,0 +1,164 @@
+"""
+Schema registry
+---------------
+• one memo per process for what the structured-output path used to rebuild on
+  every request: `model_json_schema()` (also hashed into cache keys), the strict
+  `response_format` request param and a `TypeAdapter` for non-model types
+• `validate_json` parses raw completion text straight into the model
+  (`model_validate_json` – no intermediate `json.loads` dict) and records the
+  time spent per call, reported per model by `report()`
+• `warm(...)` builds everything up front, e.g. for the large schemas
+  (mitigate_schema_8.AuditResponse, phase_0_schema_v8_2.ContextSummaryOutput)
+• returned schemas / params are shared – treat them as read-only
+"""
+from __future__ import annotations
+
+import copy
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+from pydantic import BaseModel, TypeAdapter
+
+
+def _is_model(tp: Any) -> bool:
+    return isinstance(tp, type) and issubclass(tp, BaseModel)
+
+
+def _name(tp: Any) -> str:
+    return getattr(tp, "__qualname__", None) or repr(tp)
+
+
+# ───────────────────────── memoised artefacts ─────────────────────────
+@lru_cache(maxsize=None)
+def adapter(tp: Any) -> TypeAdapter:
+    return TypeAdapter(tp)
+
+
+@lru_cache(maxsize=None)
+def json_schema(tp: Any) -> dict:
+    return tp.model_json_schema() if _is_model(tp) else adapter(tp).json_schema()
+
+
+def _resolve(root: dict, ref: str) -> dict:
+    node: Any = root
+    for part in ref.removeprefix("#/").split("/"):
+        node = node[part]
+    return node
+
+
+def _strict(schema: dict, root: dict) -> dict:
+    """
+    Structured-outputs "strict" rules, applied in place (same rules the SDK's
+    `parse` helper applies): closed objects, every property required, `None`
+    defaults dropped, single-entry allOf and `$ref`s with siblings inlined.
+    """
+    for defs in ("$defs", "definitions"):
+        for sub in (schema.get(defs) or {}).values():
+            _strict(sub, root)
+    if schema.get("type") == "object" and "additionalProperties" not in schema:
+        schema["additionalProperties"] = False
+    if isinstance(schema.get("properties"), dict):
+        schema["required"] = list(schema["properties"])
+        for sub in schema["properties"].values():
+            _strict(sub, root)
+    if isinstance(schema.get("items"), dict):
+        _strict(schema["items"], root)
+    for variant in schema.get("anyOf") or []:
+        _strict(variant, root)
+    all_of = schema.get("allOf")
+    if isinstance(all_of, list):
+        if len(all_of) == 1:
+            schema.update(_strict(all_of[0], root))
+            schema.pop("allOf")
+        else:
+            for entry in all_of:
+                _strict(entry, root)
+    if "default" in schema and schema["default"] is None:
+        schema.pop("default")
+    ref = schema.get("$ref")
+    if ref and len(schema) > 1:
+        schema.update({**copy.deepcopy(_resolve(root, ref)), **schema})
+        schema.pop("$ref")
+        return _strict(schema, root)
+    return schema
+
+
+@lru_cache(maxsize=None)
+def response_format_param(tp: Any) -> dict:
+    """Strict `{"type": "json_schema", …}` request param for chat.completions.create."""
+    schema = copy.deepcopy(json_schema(tp))
+    return {
+        "type": "json_schema",
+        "json_schema": {"schema": _strict(schema, schema), "name": tp.__name__, "strict": True},
+    }
+
+
+def warm(*types: Any) -> None:
+    for tp in types:
+        json_schema(tp)
+        response_format_param(tp)
+
+
+# ───────────────────────── timed validation ─────────────────────────
+@dataclass
+class ValidationStats:
+    calls   : int = 0
+    failures: int = 0
+    seconds : float = 0.0
+    slowest : float = 0.0
+
+    @property
+    def mean_ms(self) -> float:
+        return self.seconds / self.calls * 1e3 if self.calls else 0.0
+
+
+_stats: dict[str, ValidationStats] = {}
+_lock = threading.Lock()
+
+
+def _record(tp: Any, seconds: float, ok: bool) -> None:
+    with _lock:
+        s = _stats.setdefault(_name(tp), ValidationStats())
+        s.calls += 1
+        s.failures += not ok
+        s.seconds += seconds
+        s.slowest = max(s.slowest, seconds)
+
+
+def validate_json(tp: Any, raw: str | bytes) -> Any:
+    """Raw JSON → `tp` instance; raises pydantic.ValidationError (also for malformed JSON)."""
+    start, ok = time.perf_counter(), False
+    try:
+        result = tp.model_validate_json(raw) if _is_model(tp) else adapter(tp).validate_json(raw)
+        ok = True
+        return result
+    finally:
+        _record(tp, time.perf_counter() - start, ok)
+
+
+def validate_python(tp: Any, data: Any) -> Any:
+    """Already-decoded data → `tp` instance, timed like `validate_json`."""
+    start, ok = time.perf_counter(), False
+    try:
+        result = tp.model_validate(data) if _is_model(tp) else adapter(tp).validate_python(data)
+        ok = True
+        return result
+    finally:
+        _record(tp, time.perf_counter() - start, ok)
+
+
+def stats() -> dict[str, ValidationStats]:
+    with _lock:
+        return {name: ValidationStats(**vars(s)) for name, s in _stats.items()}
+
+
+def report() -> str:
+    if not _stats:
+        return "schema validation: no calls"
+    return "schema validation: " + "; ".join(
+        f"{name} n={s.calls} fail={s.failures} mean={s.mean_ms:.2f}ms max={s.slowest * 1e3:.2f}ms"
+        for name, s in stats().items()
+    )
@@ -0,0 +1,138 @@
+"""
+Token-aware Phase-0 batching
+----------------------------
+• every `// File:` section is measured in tokens (tiktoken when installed,
+  ~4 chars / token otherwise)
+• sections are bin-packed into batches of at most `budget` tokens, then
+  re-balanced so no single batch dominates the run's tail latency
+• a section that is larger than the budget on its own is split at
+  contract boundaries first, then at function boundaries; every piece is
+  labelled `// File: <name> (part k/n)` and the parts run as consecutive
+  batches of their own, so one file's summary is never spread over bins
+• `reserve` tokens (the docs sent with batch 0) count against batch 0
+"""
+from __future__ import annotations
+
+import math
+import re
+from typing import List
+
+try:
+    import tiktoken
+    _ENC = tiktoken.get_encoding("o200k_base")
+except Exception:                       # optional dependency / offline
+    _ENC = None
+
+FILE_HEADER_RE = re.compile(r"//\s*File:\s*([^\n]+)", re.I)
+CONTRACT_START_RE = re.compile(
+    r"^[ \t]*(?:abstract[ \t]+)?(?:contract|library|interface)[ \t]+\w+", re.M
+)
+FUNCTION_START_RE = re.compile(
+    r"^[ \t]*(?:function|modifier|constructor|fallback|receive)\b", re.M
+)
+
+
+def count_tokens(text: str) -> int:
+    if _ENC is not None:
+        return len(_ENC.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+def _split_at(text: str, pattern: re.Pattern) -> List[str]:
+    """Cut `text` in front of every line matching `pattern` (no text is lost)."""
+    cuts = [m.start() for m in pattern.finditer(text) if m.start() > 0]
+    bounds = [0, *cuts, len(text)]
+    return [text[a:b] for a, b in zip(bounds, bounds[1:]) if text[a:b]]
+
+
+def split_oversized(section: str, budget: int) -> List[str]:
+    """
+    Split one `// File:` section into pieces of ≤ `budget` tokens where the
+    code allows it. Every piece gets a `// File: <name> (part k/n)` header
+    so the model knows which file it is reading and that it is incomplete.
+    """
+    if count_tokens(section) <= budget:
+        return [section]
+
+    header = FILE_HEADER_RE.match(section)
+    name = header.group(1).strip() if header else "unknown"
+
+    segments: List[str] = []
+    for seg in _split_at(section, CONTRACT_START_RE):
+        if count_tokens(seg) > budget:
+            segments.extend(_split_at(seg, FUNCTION_START_RE))
+        else:
+            segments.append(seg)
+
+    # greedily glue neighbouring segments back together up to the budget
+    pieces: List[str] = []
+    buf, buf_tokens = "", 0
+    for seg in segments:
+        seg_tokens = count_tokens(seg)
+        if buf and buf_tokens + seg_tokens > budget:
+            pieces.append(buf)
+            buf, buf_tokens = "", 0
+        buf += seg
+        buf_tokens += seg_tokens
+    if buf:
+        pieces.append(buf)
+
+    if len(pieces) == 1:
+        return pieces
+    n = len(pieces)
+    if header:                              # part 1 already starts with the marker line
+        pieces[0] = pieces[0][header.end():].lstrip("\n")
+    return [f"// File: {name} (part {k+1}/{n})\n{piece}" for k, piece in enumerate(pieces)]
+
+
+def pack_batches(sections: List[str], budget: int, reserve: int = 0) -> List[List[str]]:
+    """
+    Pack whole sections into as few ≤ `budget`-token batches as
+    first-fit-decreasing allows, then spread them over that many batches
+    longest-first so batch sizes are balanced. Batch 0 starts with
+    `reserve` tokens already used (the docs prompt). A section split by
+    `split_oversized` becomes consecutive one-part batches at its file's
+    position. Files keep their original order inside each batch.
+    """
+    if not sections:
+        return []
+    units = [split_oversized(s, budget) for s in sections]
+    whole = [i for i, u in enumerate(units) if len(u) == 1]
+    sizes = {i: count_tokens(units[i][0]) for i in whole}
+    order = sorted(whole, key=lambda i: (-sizes[i], i))
+
+    # 1) first-fit decreasing → minimal-ish number of batches (bin 0 pre-loaded)
+    ffd: List[List[int]] = [[]]
+    ffd_load: List[int] = [reserve]
+    for i in order:
+        for b, load in enumerate(ffd_load):
+            if load + sizes[i] <= budget:
+                ffd[b].append(i); ffd_load[b] += sizes[i]
+                break
+        else:
+            ffd.append([i]); ffd_load.append(sizes[i])
+
+    # 2) same batch count, longest-processing-time assignment → balanced loads
+    n = len(ffd)
+    lpt: List[List[int]] = [[] for _ in range(n)]
+    lpt_load = [reserve] + [0] * (n - 1)
+    for i in order:
+        b = min(range(n), key=lambda k: (lpt_load[k], k))
+        lpt[b].append(i); lpt_load[b] += sizes[i]
+
+    # a lone oversized section may exceed the budget, but not on top of the reserve
+    fits = all(load <= budget or (len(b) <= 1 and not (k == 0 and reserve))
+               for k, (b, load) in enumerate(zip(lpt, lpt_load)))
+    chosen = lpt if fits else ffd
+    first, rest = sorted(chosen[0]), [sorted(b) for b in chosen[1:] if b]
+    # split files: one batch per part, placed by the file's position
+    rest += [[i] for i, u in enumerate(units) if len(u) > 1]
+    rest.sort(key=lambda b: b[0])
+
+    batches = [[units[i][0] for i in first]] if first or reserve else []
+    for b in rest:
+        if len(units[b[0]]) > 1:
+            batches.extend([part] for part in units[b[0]])
+        else:
+            batches.append([units[i][0] for i in b])
+    return batches
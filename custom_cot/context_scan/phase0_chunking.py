@@ -1,10 +1,21 @@
 from __future__ import annotations
-import os, sys, re, json, time, datetime, itertools, pathlib
+import os, sys, re, json, time, datetime, pathlib, asyncio
 from typing import List
 
 from dotenv import load_dotenv
 from pydantic import ValidationError
-from schema.phase_0_schemas.phase_0_schema_v8 import ContextSummaryOutput
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2]))  # repo root → `common`
+from common.aio import bounded_gather
+from common.clients import aclose_all, get_async_openai
+from common.llm_cache import ResponseCache
+from common.prompt_prefix import PromptCacheUsage, add_cache_control
+from common.rate_limit import estimate_tokens, limited_call, limiter_for
+from common import schema_registry
+from contract_batching import count_tokens, pack_batches
+from contract_splitter import read_sections
+from phase0_incremental import Phase0Manifest
+from schema.phase_0_schemas.phase_0_schema_v8 import ContextSummaryOutput, ProjectContext
 
 # ────────────────────────────── CONFIG ───────────────────────────
 MODEL_FAMILY        = "anthropic"
@@ -17,54 +28,64 @@ GPT_MODEL           = "gpt-4.1-2025-04-14"
 PROMPT_FILE_SYSTEM  = "utils/prompts/phase0_v6_tight_sys_prompt.py"
 INPUT_MD            = "utils/inputs/tigris_full_context.md"
 OUTPUT_DIR_PHASE0   = "logs/phase0_results/tigris/schema_v8"
-CHUNK_SIZE          = 5                 # contracts per call
+CHUNK_SIZE          = 5                 # contracts per call (BATCH_TOKEN_BUDGET = None)
+BATCH_TOKEN_BUDGET  = 15_000            # tokens of code per call; None → fixed CHUNK_SIZE
+PARALLEL_BATCHES    = True              # fan all batches out at once
+MAX_IN_FLIGHT       = 8                 # concurrent batch requests when parallel
 TEMPERATURE         = 0
+CACHE_MODE          = "readwrite"       # "readwrite" | "replay" | "off"
+INCREMENTAL         = True              # re-ingest only files whose hash changed
 PHASE               = f"{MODEL_FAMILY}_phase0_v8_chunked"
 
 # ────────────────────────── PREP INPUT ───────────────────────────
 SYSTEM_PROMPT = pathlib.Path(PROMPT_FILE_SYSTEM).read_text()
-FULL_INPUT    = pathlib.Path(INPUT_MD).read_text()
 
-docs_part, *code_parts = re.split(r"(?=//\s*File:)", FULL_INPUT, maxsplit=1, flags=re.I)
-if not code_parts:
+# single linear scan over the memory-mapped input (offsets kept per section)
+docs_part, sections = read_sections(INPUT_MD)
+if not sections:
     print("❌  No `// File:` markers found."); sys.exit(1)
-solidity_blob = code_parts[0]
-
-FILE_RE = re.compile(r"(//\s*File:[^\n]+\n(?:.|\n)*?)(?=//\s*File:|$)", re.I)
-all_files: List[str] = FILE_RE.findall(solidity_blob)
-if not all_files:
-    print("❌  Could not split contracts."); sys.exit(1)
-
-batches = [all_files[i:i + CHUNK_SIZE] for i in range(0, len(all_files), CHUNK_SIZE)]
+all_files: List[str] = [s.text for s in sections]
 
 # ───────────────────── LLM CLIENT FACTORY ────────────────────────
+# Clients come from the process-wide registry, shared by every batch request.
 load_dotenv()
+cache = ResponseCache(mode=CACHE_MODE)
+usage = PromptCacheUsage()
+schema_registry.warm(ContextSummaryOutput)      # schema built once, before the batch fan-out
 if MODEL_FAMILY == "openai":
-    from openai import OpenAI
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
     MODEL = GPT_MODEL
 
-    def llm_call(messages, pydantic_schema):
+    async def llm_call(messages, pydantic_schema):
+        client = get_async_openai()         # pooled, created once per run
+        if pydantic_schema is None:
+            resp = await limited_call(MODEL, lambda: client.chat.completions.create(
+                model=MODEL,
+                messages=messages,
+                temperature=TEMPERATURE,
+            ), tokens=estimate_tokens(messages))
+            return resp.choices[0].message.content
         # OpenAI beta `parse` endpoint
-        return client.beta.chat.completions.parse(
+        message = await cache.aparse(
+            client,
             model=MODEL,
             messages=messages,
             response_format=pydantic_schema,
             temperature=TEMPERATURE,
-        ).choices[0].message.parsed
+        )
+        usage.record(message.usage)
+        return message.parsed
 
 elif MODEL_FAMILY == "anthropic":
-    import asyncio
-    from anthropic import AsyncAnthropic, AnthropicError
+    from anthropic import AnthropicError
     # bring in your prod helper
     from utils import get_claude_client  
     MODEL = CLAUDE_MODEL
 
-    def llm_call(
+    async def llm_call(
         messages: list[dict[str,str]],
         response_model: type[ContextSummaryOutput]|None = None,
     ):
-        claude_client = get_claude_client()
+        claude_client = get_claude_client()  # pooled, created once per run
         max_tokens = 40000 if "3-7" in MODEL else 8192
 
         api_params = {
@@ -81,35 +102,69 @@ elif MODEL_FAMILY == "anthropic":
         else:
             api_params["temperature"] = TEMPERATURE
 
+        key = None
+        if response_model:
+            key = cache.make_key(MODEL, messages, response_model, **{
+                k: v for k, v in api_params.items()
+                if k not in ("model", "messages", "response_model")
+            })
+            hit = cache.get(key)
+            if hit is not None:
+                return schema_registry.validate_json(response_model, hit["content"])
+
         try:
-            resp =  asyncio.run(claude_client.completions.create(**api_params))
+            resp = await limited_call(
+                MODEL, lambda: claude_client.completions.create(**api_params),
+                tokens=estimate_tokens(messages),
+            )
+            raw = getattr(resp, "_raw_response", resp)     # instructor keeps the SDK message here
+            usage.record(getattr(raw, "usage", None))
             if response_model:
                 # structured output is available as .parsed
+                cache.put(key, {"content": resp.model_dump_json()})
                 return resp
             else:
                 # fallback to raw text
                 return resp.content[0].text
         except AnthropicError as e:
-            print(f"Anthropic API error: {e}", exc_info=True)
-            raise print("Anthropic API error", {"error": str(e)}) from e
+            print(f"Anthropic API error: {e}")
+            raise
 
 else:
     print("Unsupported MODEL_FAMILY"); sys.exit(1)
 
+# ───────────────────── INCREMENTAL PLAN ──────────────────────────
+MANIFEST_PATH = pathlib.Path(OUTPUT_DIR_PHASE0) / f"{PHASE}_manifest.json"
+manifest = Phase0Manifest.load(MANIFEST_PATH) if INCREMENTAL else Phase0Manifest()
+full_run = manifest.needs_full_run(MODEL, docs_part)
+# incremental runs keep the stored project context, so the docs are not re-sent
+batch_docs = docs_part if full_run else ""
+todo_files = all_files if full_run else manifest.changed(all_files)
+print(f"🧮  {'full run' if full_run else 'incremental'}: "
+      f"{len(todo_files)}/{len(all_files)} file(s) to ingest")
+
+if BATCH_TOKEN_BUDGET:
+    # batch 0 also carries the docs, so their tokens come out of its budget
+    batches = pack_batches(todo_files, BATCH_TOKEN_BUDGET,
+                           reserve=count_tokens(batch_docs) if batch_docs else 0)
+    print(f"📦  {len(todo_files)} file(s) → {len(batches)} batch(es), tokens per batch: "
+          f"{[sum(count_tokens(f) for f in b) for b in batches]}")
+else:
+    batches = [todo_files[i:i + CHUNK_SIZE] for i in range(0, len(todo_files), CHUNK_SIZE)]
+
 # ──────────────────── CHUNKED INGESTION LOOP ─────────────────────
-def run_batch(idx: int, files: List[str]) -> ContextSummaryOutput | None:
+async def run_batch(idx: int, files: List[str]) -> ContextSummaryOutput | None:
     print(f"📄  Batch {idx+1}/{len(batches)}  – {len(files)} contract(s)")
-    docs  = docs_part if idx == 0 else ""
+    docs  = batch_docs if idx == 0 else ""
     code  = "\n\n".join(files)
 
     if MODEL_FAMILY == "anthropic":
-        # Claude: everything in one *user* turn
-        merged = f"""{SYSTEM_PROMPT}
-        {docs}
-        ```solidity
-        {code}
-        ``"""
-        messages = [{"role": "user", "content": merged}]
+        # Claude: user turns only; the system prompt leads with a cache
+        # breakpoint so every later batch reuses the cached prefix
+        messages = add_cache_control([
+            {"role": "user", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"{docs}\n```solidity\n{code}\n```"},
+        ], n_static=1)
     else:
         # OpenAI: regular system / user split
         messages = [
@@ -118,35 +173,64 @@ def run_batch(idx: int, files: List[str]) -> ContextSummaryOutput | None:
             {"role": "user",   "content": f"```solidity\n{code}\n```"},
         ]
     try:
-        return llm_call(messages, ContextSummaryOutput)
+        return await llm_call(messages, ContextSummaryOutput)
     except ValidationError as ve:
         print("⚠️  Pydantic validation failed.")
-        raw_out = llm_call(messages, None)  # get plain text for debugging
+        raw_out = await llm_call(messages, None)  # get plain text for debugging
         ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         err_dir = pathlib.Path(OUTPUT_DIR_PHASE0, "errors"); err_dir.mkdir(parents=True, exist_ok=True)
         (err_dir / f"batch{idx}_{ts}.txt").write_text(str(raw_out))
         return None
 
-partials: List[ContextSummaryOutput] = []
-for i, chunk in enumerate(batches):
-    out = run_batch(i, chunk)
-    if out: partials.append(out)
-
-if not partials:
+async def ingest_batches() -> List[ContextSummaryOutput | None]:
+    """All batches over the shared client; results stay in batch order."""
+    in_flight = MAX_IN_FLIGHT if PARALLEL_BATCHES else 1
+    try:
+        outs = await bounded_gather(batches, run_batch, in_flight)
+    finally:
+        await aclose_all()
+    for i, out in enumerate(outs):
+        if isinstance(out, BaseException):
+            print(f"❌  Batch {i+1} failed: {out}")
+    return [None if isinstance(out, BaseException) else out for out in outs]
+
+start = time.time()
+outputs = asyncio.run(ingest_batches()) if batches else []
+partials: List[ContextSummaryOutput] = [out for out in outputs if out]
+print(f"⏱️  {len(batches)} batch(es) ingested in {time.time()-start:.1f}s ({cache.stats()})")
+print(usage.report())
+print(limiter_for(MODEL).report())
+print(schema_registry.report())
+
+# an incremental run with nothing to ingest has no batches (and no partials)
+if batches and not partials:
     print("❌  All batches failed."); sys.exit(1)
 
 # ───────────── MERGE PARTIAL SUMMARIES (same as before) ──────────
-merged_contracts = list(itertools.chain.from_iterable(p.analyzed_contracts for p in partials))
-proj_ctx = next((p.project_context for p in partials
-                 if p.project_context and p.project_context.overall_goal_raw.strip()), partials[0].project_context)
+if full_run:
+    proj_ctx = next((p.project_context for p in partials
+                     if p.project_context and p.project_context.overall_goal_raw.strip()), partials[0].project_context)
 
-for p in partials[1:]:
-    proj_ctx.invariants            += p.project_context.invariants
-    proj_ctx.general_security_ctx  += p.project_context.general_security_ctx
+    for p in partials[1:]:
+        proj_ctx.invariants            += p.project_context.invariants
+        proj_ctx.general_security_ctx  += p.project_context.general_security_ctx
 
-dedup = lambda seq, key: list({key(x): x for x in seq}.values())
-proj_ctx.invariants           = dedup(proj_ctx.invariants,          lambda x: x.description)
-proj_ctx.general_security_ctx = dedup(proj_ctx.general_security_ctx,lambda x: x.details)
+    dedup = lambda seq, key: list({key(x): x for x in seq}.values())
+    proj_ctx.invariants           = dedup(proj_ctx.invariants,          lambda x: x.description)
+    proj_ctx.general_security_ctx = dedup(proj_ctx.general_security_ctx,lambda x: x.details)
+else:
+    # docs unchanged → the stored project context still holds
+    proj_ctx = ProjectContext.model_validate(manifest.project_context)
+
+# splice fresh per-file summaries into the stored ones
+manifest.record(MODEL, docs_part, all_files, batches,
+                [out.model_dump(mode="json") if out else None for out in outputs],
+                proj_ctx.model_dump(mode="json"))
+if INCREMENTAL:
+    manifest.save(MANIFEST_PATH)
+# full run: every summary comes straight from this run's batches
+merged_contracts = ([c for p in partials for c in p.analyzed_contracts] if full_run
+                    else manifest.contracts(all_files))
 
 final = ContextSummaryOutput(analyzed_contracts=merged_contracts,
                              project_context   = proj_ctx)
@@ -0,0 +1,134 @@
+"""
+Incremental Phase-0 re-ingestion
+--------------------------------
+• every `// File:` section is hashed (sha256 of its exact text) and the
+  manifest stores that hash next to the `ContractSummary` entries the
+  model produced for the file
+• on re-run only new / changed files are sent to the model; unchanged
+  summaries are spliced back from the manifest, removed files are dropped
+• the project context is reused while the docs part is unchanged; a docs
+  change (or another model / a missing manifest) re-ingests everything,
+  because invariants and security context are merged across all batches
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pathlib
+import re
+import tempfile
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Sequence
+
+from contract_batching import FILE_HEADER_RE
+
+_PART_RE = re.compile(r"\s*\(part \d+/\d+\)\s*$")
+
+
+def sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_name(section: str) -> str:
+    """`// File: Trading.sol (part 2/3)` → `Trading.sol`."""
+    m = FILE_HEADER_RE.match(section.lstrip())
+    return _PART_RE.sub("", m.group(1).strip()) if m else "unknown"
+
+
+def _norm(name: str) -> str:
+    return _PART_RE.sub("", name).strip().rsplit("/", 1)[-1].lower()
+
+
+def attribute(contracts: Sequence[dict], batch_files: Sequence[str]) -> Dict[str, List[dict]]:
+    """
+    Assign each summary of one batch to the file it describes (matched on
+    `file_name`); summaries the model labelled with an unknown name go to
+    the batch's first file so they are refreshed together with it.
+    """
+    names = list(dict.fromkeys(batch_files))
+    by_norm = {_norm(n): n for n in names}
+    out: Dict[str, List[dict]] = {n: [] for n in names}
+    for c in contracts:
+        out[by_norm.get(_norm(c.get("file_name", "")), names[0])].append(c)
+    return out
+
+
+def _dedup(contracts: Sequence[dict]) -> List[dict]:
+    """Drop repeats of one contract (e.g. summarised again by a later part)."""
+    key = lambda c: (_norm(c.get("file_name", "")), c.get("core_purpose_raw", "").strip())
+    return list({key(c): c for c in contracts}.values())
+
+
+@dataclass
+class Phase0Manifest:
+    model          : str | None = None
+    docs_hash      : str | None = None
+    project_context: dict | None = None
+    files          : Dict[str, dict] = field(default_factory=dict)   # name → {"hash", "contracts"}
+
+    @classmethod
+    def load(cls, path: str | os.PathLike) -> "Phase0Manifest":
+        try:
+            return cls(**json.loads(pathlib.Path(path).read_text(encoding="utf-8")))
+        except FileNotFoundError:
+            return cls()
+
+    def save(self, path: str | os.PathLike) -> None:
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+
+    # ───────────────────────── planning ─────────────────────────
+    def needs_full_run(self, model: str, docs: str) -> bool:
+        return (self.model != model or self.docs_hash != sha256(docs)
+                or self.project_context is None)
+
+    def changed(self, sections: Sequence[str]) -> List[str]:
+        """Sections whose file is new or whose text hash differs."""
+        return [s for s in sections
+                if self.files.get(file_name(s), {}).get("hash") != sha256(s)]
+
+    # ───────────────────────── recording ────────────────────────
+    def record(
+        self,
+        model: str,
+        docs: str,
+        sections: Sequence[str],
+        batches: Sequence[Sequence[str]],
+        outputs: Sequence[dict | None],
+        project_context: dict | None,
+    ) -> None:
+        """
+        Store the summaries of every successful batch under the hash of the
+        section they came from. A file split over several batches collects
+        the summaries of all its parts (duplicates dropped). A file with any
+        part in a failed batch keeps its previous entry (and stale hash), so
+        the next run retries it.
+        """
+        hashes = {file_name(s): sha256(s) for s in sections}
+        fresh: Dict[str, List[dict]] = {}
+        failed = set()
+        for files, out in zip(batches, outputs):
+            names = [file_name(f) for f in files]
+            if out is None:
+                failed.update(names)
+                continue
+            for name, contracts in attribute(out["analyzed_contracts"], names).items():
+                fresh.setdefault(name, []).extend(contracts)
+        for name, contracts in fresh.items():
+            if name not in failed:
+                self.files[name] = {"hash": hashes.get(name), "contracts": _dedup(contracts)}
+        self.files = {n: e for n, e in self.files.items() if n in hashes}
+        self.model = model
+        self.docs_hash = sha256(docs)
+        if project_context is not None:
+            self.project_context = project_context
+
+    def contracts(self, sections: Sequence[str]) -> List[dict]:
+        """All stored summaries, in input-file order."""
+        order = list(dict.fromkeys(file_name(s) for s in sections))
+        return [c for n in order for c in self.files.get(n, {}).get("contracts", [])]
@@ -3,11 +3,17 @@ import pathlib
 import datetime
 import time
 import os
+import sys
 from dotenv import load_dotenv
-from openai import OpenAI
 from schema.phase_0_schemas.phase_0_schema_v8 import ContextSummaryOutput
 from pydantic import ValidationError
 
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2]))  # repo root → `common`
+from common.batch_api import BatchRequest, run_batch
+from common.clients import get_openai
+from common.llm_cache import ResponseCache
+from common.rate_limit import estimate_tokens, limited_call_sync
+
 # ------------ models & paths -------------------------------------------------
 GPT_4O   = "gpt-4o-2024-08-06"
 GPT_4_1  = "gpt-4.1-2025-04-14"
@@ -19,6 +25,8 @@ PROMPT_FILE_SYSTEM = "utils/prompts/phase0_v6_tight_sys_prompt.py"
 INPUT_FILE_FULL_CONTEXT = "utils/inputs/tigris_full_context.md"
 PHASE = "phase0_v8"
 OUTPUT_DIR_PHASE0 = "logs/phase0_results/tigris/schema_v8"
+CACHE_MODE = "readwrite"  # "readwrite" | "replay" | "off"
+BATCH_MODE = False        # True → offline Batch API (submit, poll, rehydrate)
 
 # --- Load prompts and input ---
 try:
@@ -35,7 +43,8 @@ openai_api_key = os.getenv("OPENAI_API_KEY")
 if not openai_api_key:
     print("Error: OPENAI_API_KEY not found in environment variables.")
     exit(1)
-client = OpenAI(api_key=openai_api_key)
+client = get_openai(openai_api_key)
+cache = ResponseCache(mode=CACHE_MODE)
 
 # ───────────────── Function for Phase 0 Analysis ─────────────────
 def perform_phase0_analysis() -> ContextSummaryOutput | None:
@@ -49,17 +58,25 @@ def perform_phase0_analysis() -> ContextSummaryOutput | None:
     ]
 
     try:
-        completion = client.beta.chat.completions.parse(
-            model=MODEL,
-            messages=messages,
-            response_format=ContextSummaryOutput,
-            temperature=0
-        )
+        if BATCH_MODE:
+            request = BatchRequest(PHASE, MODEL, messages, ContextSummaryOutput, {"temperature": 0})
+            message = run_batch(client, [request], workdir=f"{OUTPUT_DIR_PHASE0}/batches", cache=cache)[PHASE]
+            if isinstance(message, Exception):
+                raise message
+        else:
+            message = cache.parse(
+                client,
+                model=MODEL,
+                messages=messages,
+                response_format=ContextSummaryOutput,
+                temperature=0
+            )
 
         # Access the parsed Pydantic object
-        parsed_output: ContextSummaryOutput = completion.choices[0].message.parsed
+        parsed_output: ContextSummaryOutput = message.parsed
         analysis_time = time.time() - start_time
-        print(f"Phase 0 analysis completed successfully in {analysis_time:.2f} seconds.")
+        print(f"Phase 0 analysis completed successfully in {analysis_time:.2f} seconds "
+              f"({'cached' if message.cached else 'live'}).")
         return parsed_output
 
     except ValidationError as e:
@@ -67,10 +84,10 @@ def perform_phase0_analysis() -> ContextSummaryOutput | None:
         print(e)
         try:
             # Fallback to standard completion call to get raw text for debugging
-            raw_completion = client.chat.completions.create(
+            raw_completion = limited_call_sync(MODEL, lambda: client.chat.completions.create(
                  model=MODEL,
                  messages=messages,
-            )
+            ), tokens=estimate_tokens(messages))
             raw_text = raw_completion.choices[0].message.content
             print("\n--- Raw LLM Output (Failed Validation) ---")
             print(raw_text)
@@ -11,6 +11,11 @@ from schema.phase_0_schemas.phase_0_schema_v9 import (
 )
 from utils import get_claude_client
 
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2]))  # repo root → `common`
+from common.clients import aclose_all, get_openai
+from common.llm_cache import ResponseCache
+from common.rate_limit import estimate_tokens, limited_call
+
 # ────────────────────────────── CONFIG ───────────────────────────
 # MODEL_FAMILY       = "anthropic"
 MODEL_FAMILY       = "openai"
@@ -20,6 +25,7 @@ PROMPT_FILE_SYSTEM = "utils/prompts/phase0_v6_tight_sys_prompt.py"
 INPUT_MD           = "utils/inputs/tigris_full_context.md"
 OUTPUT_DIR_PHASE0  = "logs/phase0_results/tigris/schema_v9"
 TEMPERATURE        = 0
+CACHE_MODE         = "readwrite"       # "readwrite" | "replay" | "off"
 
 # ────────────────────────── PREP INPUT ───────────────────────────
 SYSTEM_PROMPT = pathlib.Path(PROMPT_FILE_SYSTEM).read_text()
@@ -27,24 +33,28 @@ FULL_INPUT    = pathlib.Path(INPUT_MD).read_text()
 
 # ───────────────────── LLM CLIENT FACTORY ────────────────────────
 load_dotenv()
+cache = ResponseCache(mode=CACHE_MODE)
 if MODEL_FAMILY == "openai":
-    from openai import OpenAI
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    client = get_openai()
     MODEL = GPT_MODEL
 
     def llm_call(messages, schema):
-        return client.beta.chat.completions.parse(
+        return cache.parse(
+            client,
             model=MODEL,
             messages=messages,
             response_format=schema,
             temperature=TEMPERATURE,
-        ).choices[0].message.parsed
+        ).parsed
 
 elif MODEL_FAMILY == "anthropic":
     import asyncio
     from anthropic import AnthropicError
 
     MODEL = CLAUDE_MODEL
+    # One loop for the whole script: the pooled client is bound to it, so the
+    # three phase calls share keep-alive connections.
+    loop = asyncio.new_event_loop()
 
     def llm_call(messages, schema):
         claude = get_claude_client()
@@ -62,11 +72,13 @@ elif MODEL_FAMILY == "anthropic":
             api_params["temperature"] = TEMPERATURE
 
         try:
-            resp = asyncio.run(claude.completions.create(**api_params))
+            resp = loop.run_until_complete(limited_call(
+                MODEL, lambda: claude.completions.create(**api_params), tokens=estimate_tokens(messages),
+            ))
             return resp
         except AnthropicError as e:
-            print(f"Anthropic API error: {e}", exc_info=True)
-            raise print("Anthropic API error", {"error": str(e)}) from e
+            print(f"Anthropic API error: {e}")
+            raise
 
 else:
     print("Unsupported MODEL_FAMILY"); sys.exit(1)
@@ -98,4 +110,7 @@ ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
 outfile = outdir / f"phase0_{MODEL}_{ts}.json"
 outfile.write_text(final.model_dump_json(indent=2))
 
-print(f"✅ Phase-0 complete – {len(analyzed_contracts)} contracts saved to {outfile}")
\ No newline at end of file
+print(f"✅ Phase-0 complete – {len(analyzed_contracts)} contracts saved to {outfile}")
+if MODEL_FAMILY == "anthropic":
+    loop.run_until_complete(aclose_all())
+    loop.close()
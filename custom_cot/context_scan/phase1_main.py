@@ -5,11 +5,18 @@ import time
 import os
 import sys
 from dotenv import load_dotenv
-from openai import OpenAI
 from schema.phase_0_schemas.phase_0_schema_v8_2 import ContextSummaryOutput
 from schema.phase_1_schemas.phase_1_schema_free import FinalAuditReport
 from pydantic import ValidationError, BaseModel
 
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2]))  # repo root → `common`
+from common.batch_api import BatchRequest, run_batch
+from common.clients import get_openai
+from common.llm_cache import ResponseCache
+from common import schema_registry
+
+schema_registry.warm(ContextSummaryOutput, FinalAuditReport)   # large schemas: built once per process
+
 # ------------ models & paths -------------------------------------------------
 GPT_4O   = "gpt-4o-2024-08-06"
 GPT_4_1  = "gpt-4.1-2025-04-14"
@@ -20,6 +27,8 @@ MODEL = O3
 PROMPT_FILE_SYSTEM = "utils/prompts/phase1_free_sys_prompt.py"
 # INPUT_FILE_FULL_CONTEXT = "utils/inputs/phase0_full_context.md"
 PHASE = "o3_phase0v8_chunk_openai"
+CACHE_MODE = "readwrite"  # "readwrite" | "replay" | "off"
+BATCH_MODE = False        # True → offline Batch API (submit, poll, rehydrate)
 
 OUTPUT_DIR_PHASE1 = "logs/phase1_results/vultisig"
 
@@ -54,18 +63,14 @@ except Exception as e:
     
 # --- Load Phase 0 Results ---
 try:
-    with open(INPUT_PHASE0_OUTPUT_FILE, 'r', encoding='utf-8') as f:
-        phase0_data = json.load(f)
-        # Validate and parse the loaded data using the Phase 0 schema
-        phase0_summary: ContextSummaryOutput = ContextSummaryOutput.model_validate(phase0_data)
+    with open(INPUT_PHASE0_OUTPUT_FILE, 'rb') as f:
+        # Validate the raw JSON straight into the Phase 0 schema (malformed JSON → ValidationError)
+        phase0_summary: ContextSummaryOutput = schema_registry.validate_json(ContextSummaryOutput, f.read())
     print(f"Successfully loaded and validated Phase 0 output from: {INPUT_PHASE0_OUTPUT_FILE}")
 except FileNotFoundError:
     print(f"Error: Phase 0 output file not found at {INPUT_PHASE0_OUTPUT_FILE}")
     print("Please ensure the Phase 0 script ran successfully and update the path.")
     sys.exit(1)
-except json.JSONDecodeError:
-    print(f"Error: Could not decode JSON from {INPUT_PHASE0_OUTPUT_FILE}")
-    sys.exit(1)
 except ValidationError as e:
     print(f"Error: Phase 0 output file does not match ContextSummaryOutput schema:")
     print(e)
@@ -80,7 +85,8 @@ openai_api_key = os.getenv("OPENAI_API_KEY")
 if not openai_api_key:
     print("Error: OPENAI_API_KEY not found in environment variables.")
     exit(1)
-client = OpenAI(api_key=openai_api_key)
+client = get_openai(openai_api_key)
+cache = ResponseCache(mode=CACHE_MODE)
 
 # ───────────────── Function for Phase 1 Analysis ─────────────────
 def perform_phase1_analysis(
@@ -107,17 +113,26 @@ def perform_phase1_analysis(
 
     try:
         # Use the 'parse' method with the Phase 1 schema
-        completion = client.beta.chat.completions.parse(
-            model=MODEL,
-            messages=messages,
-            response_format=FinalAuditReport,
-            reasoning_effort="high" # added
-        )
+        if BATCH_MODE:
+            request = BatchRequest(PHASE, MODEL, messages, FinalAuditReport, {"reasoning_effort": "high"})
+            message = run_batch(client, [request], workdir=f"{OUTPUT_DIR_PHASE1}/batches", cache=cache)[PHASE]
+            if isinstance(message, Exception):
+                raise message
+        else:
+            message = cache.parse(
+                client,
+                model=MODEL,
+                messages=messages,
+                response_format=FinalAuditReport,
+                reasoning_effort="high" # added
+            )
 
         # Access the parsed Pydantic object
-        parsed_output: FinalAuditReport = completion.choices[0].message.parsed
+        parsed_output: FinalAuditReport = message.parsed
         analysis_time = time.time() - start_time
-        print(f"Phase 1 analysis completed successfully in {analysis_time:.2f} seconds.")
+        print(f"Phase 1 analysis completed successfully in {analysis_time:.2f} seconds "
+              f"({'cached' if message.cached else 'live'}).")
+        print(schema_registry.report())
         return parsed_output
 
     except Exception as e:
@@ -1,30 +1,27 @@
-import httpx
+import pathlib
+import sys
 
-from anthropic import AsyncAnthropic
-from openai import OpenAI
 from dotenv import load_dotenv
 import os
-import instructor
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2]))  # repo root → `common`
+from common.clients import get_instructor_claude
 
         
 load_dotenv(); ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 
 def get_claude_client():
-    """Get a configured Claude client instance with instructor integration."""
+    """
+    Get the process-wide Claude client with instructor integration.
+
+    The underlying AsyncAnthropic / httpx pool is built once per event loop
+    by `common.clients`, so calling this per request is cheap and reuses
+    keep-alive connections.
+    """
     try:
-        timeout = httpx.Timeout(300.0, connect=10.0)  # 5 minutes total, 10s connect
-        limits = httpx.Limits(max_keepalive_connections=5, max_connections=10)
-        http_client = httpx.AsyncClient(timeout=timeout, limits=limits)
-        base_claude_client = AsyncAnthropic(
-            api_key=ANTHROPIC_API_KEY,
-            http_client=http_client,
-        )
-        claude_client = instructor.from_anthropic(
-            base_claude_client, mode=instructor.Mode.ANTHROPIC_REASONING_TOOLS
-        )
-        return claude_client
+        return get_instructor_claude(ANTHROPIC_API_KEY)
     except Exception as e:
-        print(f"[LLMClient] Failed to initialize Claude client: {str(e)}", exc_info=True)
+        print(f"[LLMClient] Failed to initialize Claude client: {str(e)}")
         raise
 
 
@@ -1,11 +1,13 @@
 
 
-import json, pathlib, datetime, time, os
-from textwrap import dedent
+import json, pathlib, datetime, time, sys
 from dotenv import load_dotenv
-from openai import OpenAI
 
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2]))  # repo root → `common`
 from schema.mitigate_schema_6 import AuditResponse, FindingResponse
+from common.llm_cache import ResponseCache
+from common.prompt_prefix import with_prefix
+from utils.review_engine import run_reviews
 
 # ------------ models & paths -------------------------------------------------
 GPT_4O   = "gpt-4o-2024-08-06"
@@ -23,45 +25,55 @@ FINDINGS = json.loads(pathlib.Path(FINDINGS_FILE).read_text())
 # BATCH_SIZE = len(FINDINGS)
 BATCH_SIZE = 20
 SCHEMA = "schema_8"
+MAX_IN_FLIGHT = 4                       # concurrent batch requests
+CACHE_MODE = "readwrite"                # "readwrite" | "replay" | "off"
+BATCH_MODE = False                      # True → offline Batch API (overnight sweeps)
 # ───────────────────────── OpenAI client ─────────────────────────
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 # ───────────────────────── helper function ───────────────────────
-def analyse_batch(batch: list[dict], start_index: int) -> list[FindingResponse]:
-    """Return FindingResponse list for `batch` (offset keeps original indices)."""
+STATIC_PREFIX = [                       # byte-identical for every batch
+    {"role": "system", "content": TASK_PROMPT},
+    {"role": "user",   "content": CONTRACT},
+    {"role": "user",   "content":
+        "For each finding below, populate `strategy`, `reasoning_summary`, and `adjustment`. "
+        "Return JSON conforming to AuditResponse schema (list of finding responses)."},
+]
+
+def build_messages(_: int, item: tuple[int, list[dict]]) -> list[dict]:
+    """Messages for one `(start_index, batch)` (offset keeps original indices)."""
+    start_index, batch = item
     findings_block = "\n".join(
         f"Finding {start_index+i} JSON:\n```json\n{json.dumps(f)}\n```"
         for i, f in enumerate(batch)
     )
     
-    messages = [
-        {"role": "system", "content": TASK_PROMPT},
-        {"role": "user",   "content": CONTRACT},
-        {"role": "user",   "content":
-            "For each finding below, populate `strategy`, `reasoning_summary`, and `adjustment`. "
-            "Return JSON conforming to AuditResponse schema (list of finding responses)."},
-        {"role": "user",   "content": findings_block},
-    ]
-
-    completion = client.beta.chat.completions.parse(
-        model=MODEL,
-        messages=messages,
-        response_format=AuditResponse,
-        # temperature=0,
-    )
-
-    return completion.choices[0].message.parsed.findings
+    return with_prefix(STATIC_PREFIX, {"role": "user", "content": findings_block})
 
 # ───────────────────────── main loop ─────────────────────────────
 all_findings: list[FindingResponse] = []
 start_ts = time.time()
 
-for start_idx in range(0, len(FINDINGS), BATCH_SIZE):
-    batch = FINDINGS[start_idx : start_idx + BATCH_SIZE]
-    print(f"Analyzing batch {start_idx}…{start_idx+len(batch)-1} (size {len(batch)})")
-    all_findings.extend(analyse_batch(batch, start_idx))
-    print("Done.")
+batches = [
+    (start_idx, FINDINGS[start_idx : start_idx + BATCH_SIZE])
+    for start_idx in range(0, len(FINDINGS), BATCH_SIZE)
+]
+results = run_reviews(
+    batches, build_messages,
+    model=MODEL,
+    response_format=AuditResponse,
+    max_in_flight=MAX_IN_FLIGHT,
+    cache=ResponseCache(mode=CACHE_MODE),
+    batch=BATCH_MODE,
+    label="batch",
+    # temperature=0,
+)
+
+for (start_idx, batch), r in zip(batches, results):
+    if not r.ok:
+        raise r.error or RuntimeError(f"Model refused on batch {start_idx}: {r.refusal}")
+    print(f"Batch {start_idx}…{start_idx+len(batch)-1} (size {len(batch)}) done.")
+    all_findings.extend(r.parsed.findings)
 
 # flatten adjustments
 all_adj = [fr.adjustment.model_dump() for fr in all_findings]
@@ -1,10 +1,12 @@
 
-import json, pathlib, datetime, time, os
-from textwrap import dedent
+import json, pathlib, datetime, time, sys
 from dotenv import load_dotenv
-from openai import OpenAI
 
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2]))  # repo root → `common`
 from schema.mitigate_schema_8 import AuditResponse, FindingResponse
+from common.llm_cache import ResponseCache
+from common.prompt_prefix import with_prefix
+from utils.review_engine import run_reviews
 
 # ------------ models & paths -------------------------------------------------
 GPT_4O   = "gpt-4o-2024-08-06"
@@ -21,30 +23,25 @@ TASK_PROMPT = pathlib.Path(PROMPT_FILE).read_text()
 CONTRACT = pathlib.Path(CONTRACT_FILE).read_text()
 FINDINGS = json.loads(pathlib.Path(FINDINGS_FILE).read_text())
 SCHEMA = "schema_8"
+MAX_IN_FLIGHT = 8                       # concurrent requests
+CACHE_MODE = "readwrite"                # "readwrite" | "replay" | "off"
+BATCH_MODE = False                      # True → offline Batch API (overnight sweeps)
 # ───────────────────────── OpenAI client ─────────────────────────
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 # ───────────────────────── helper function ───────────────────────
-def analyse_finding(idx: int, finding_json: dict) -> FindingResponse:
-    """Call OpenAI once, return validated FindingResponse."""
-    messages = [
-        {"role": "system", "content": TASK_PROMPT},
-        {"role": "user",   "content": CONTRACT},
-        {"role": "user",   "content":
-            "Populate `strategy` (all fields), then `reasoning_summary` (≤3 sentences), "
-            "then `adjustment`. Return JSON conforming to AuditResponse schema."},
-        {"role": "user",   "content": f"Finding {idx} JSON:\n```json\n{json.dumps(finding_json)}\n```"},
-    ]
-
-    completion = client.beta.chat.completions.parse(
-        model=MODEL,
-        messages=messages,
-        response_format=AuditResponse,
-        temperature=0 # cannot be used for reasoning models
-    )
-
-    return completion.choices[0].message.parsed.findings[0]
+STATIC_PREFIX = [                       # byte-identical for every finding
+    {"role": "system", "content": TASK_PROMPT},
+    {"role": "user",   "content": CONTRACT},
+    {"role": "user",   "content":
+        "Populate `strategy` (all fields), then `reasoning_summary` (≤3 sentences), "
+        "then `adjustment`. Return JSON conforming to AuditResponse schema."},
+]
+
+def build_messages(idx: int, finding_json: dict) -> list[dict]:
+    """Messages for one finding; the engine validates them into AuditResponse."""
+    return with_prefix(STATIC_PREFIX,
+        {"role": "user", "content": f"Finding {idx} JSON:\n```json\n{json.dumps(finding_json)}\n```"})
 
 # ───────────────────────── main loop ─────────────────────────────
 all_findings: list[FindingResponse] = []
@@ -52,30 +49,32 @@ all_adj      : list[dict] = []
 
 start = time.time()
 
-for idx, finding in enumerate(FINDINGS):
-    print(f"Analyzing finding #{idx} …")
-    try:
-        fr = analyse_finding(idx, finding)
-    except Exception as e:
-        print(f"Error on #{idx}: {e}")
+results = run_reviews(
+    FINDINGS, build_messages,
+    model=MODEL,
+    response_format=AuditResponse,
+    max_in_flight=MAX_IN_FLIGHT,
+    cache=ResponseCache(mode=CACHE_MODE),
+    batch=BATCH_MODE,
+    temperature=0, # cannot be used for reasoning models
+)
+
+for r in results:
+    if not r.ok:
+        print(f"Error on #{r.index}: {r.error or r.refusal}")
         continue
 
+    fr = r.parsed.findings[0]
     all_findings.append(fr)
     all_adj.append(fr.adjustment.model_dump())
     print("Done.")
 
 # idx = 26
-# finding = FINDINGS[26]
-# print(f"Analyzing finding #{idx} …")
-
-# try:
-#     fr = analyse_finding(idx, finding)
-# except Exception as e:
-#     print(f"Error on #{idx}: {e}")
-
-# all_findings.append(fr)
-# all_adj.append(fr.adjustment.model_dump())
-# print("Done.")
+# r = run_reviews([FINDINGS[idx]], lambda _, f: build_messages(idx, f),
+#                 model=MODEL, response_format=AuditResponse, temperature=0)[0]
+# if r.ok:
+#     all_findings.append(r.parsed.findings[0])
+#     all_adj.append(r.parsed.findings[0].adjustment.model_dump())
 
 # ───────────────────────── save outputs ──────────────────────────
 report = AuditResponse(
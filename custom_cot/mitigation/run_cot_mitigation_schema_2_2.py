@@ -1,15 +1,22 @@
-from openai import OpenAI
 from schema.mitigate_schema_2 import AuditResponse
-import json, pathlib, os, time
+import json, pathlib, time, sys
 from dotenv import load_dotenv
 import datetime
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2]))  # repo root → `common`
 from utils.mitigation.load_rulebook import load_rulebook_md, load_rulebook_html
+from common.llm_cache import ResponseCache
+from common.prompt_prefix import with_prefix
+from utils.review_engine import run_reviews
 # ---------- GPT models ----------
 GPT_4O = "gpt-4o-2024-08-06"
 GPT_4_1 = "gpt-4.1-2025-04-14"
 O4_MINI = "o4-mini"
 # ---------- artefacts ----------
 MODEL = O4_MINI
+MAX_IN_FLIGHT = 8                       # concurrent requests
+CACHE_MODE = "readwrite"                # "readwrite" | "replay" | "off"
+BATCH_MODE = False                      # True → offline Batch API (overnight sweeps)
 TASK_PROMPT  = pathlib.Path("utils/mitigation/task_prompt_reasoning.py").read_text()
 # RULEBOOK = pathlib.Path("utils/mitigation/mitigation_rulebook_1.md").read_text()
 # RULE_CHUNKS = load_rulebook_md()
@@ -24,11 +31,25 @@ def checklist_bullets(items: list[dict]) -> str:
 
 def build_rule_context(checklist):
     needed_tags = {q["rule"] for q in checklist}
-    return "\n\n".join(RULE_CHUNKS[tag] for tag in needed_tags)
+    return "\n\n".join(RULE_CHUNKS[tag] for tag in sorted(needed_tags))  # sorted → byte-stable
+
+# static context (identical for all iterations, built once) -----------
+STATIC_PREFIX = [
+    {"role": "system", "content": TASK_PROMPT},
+    {"role": "user",   "content": build_rule_context(CHECKLIST)},
+    {"role": "user",   "content": CONTRACT},
+    {"role": "user",   "content":
+        "Answer the checklist **in order** using the AuditResponse schema.\n"},
+    {"role": "user",   "content": checklist_bullets(CHECKLIST)},
+]
+
+def build_messages(idx: int, finding: dict) -> list[dict]:
+    # dynamic per‑finding content always goes last ----------------------
+    return with_prefix(STATIC_PREFIX,
+        {"role": "user", "content": f"Finding {idx}: {json.dumps(finding)}"})
 
 # ---------- client ----------
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 all_reviews = []       # successful FindingReview objects
 all_adjustments = []    # flattened adjustment dicts
@@ -36,56 +57,43 @@ refusals = []      # bookkeeping for refusals
 
 start_time = time.time()
 
-for idx, finding in enumerate(FINDINGS):
-    call_start = time.time()
-    
-    rule_context = build_rule_context(CHECKLIST)
-    
-    messages = [
-        # static context (identical for all iterations) -----------------
-        {"role": "system", "content": TASK_PROMPT},
-        {"role": "user",   "content": rule_context},
-        {"role": "user",   "content": CONTRACT},
-
-        # dynamic per‑finding ------------------------------------------
-        {"role": "user", "content": f"Finding {idx}: {json.dumps(finding)}"},
-        {"role": "user", "content":
-            "Answer the checklist **in order** using the AuditResponse schema.\n"},
-        {"role": "user", "content": checklist_bullets(CHECKLIST)},
-    ]
-
-    result = client.beta.chat.completions.parse(
-        model=MODEL,
-        response_format=AuditResponse,
-        messages=messages,
-    )
-
-    # Struct from doc:
-    # result = client.chat.completions.create(
-    #     model=MODEL,
-    #     messages=messages,
-    #     text={
-    #         "format": {
-    #             "type": "json_schema",
-    #             "schema": AuditResponse.model_json_schema(),
-    #             "strict": True
-    #         }
-    #     }
-    # )
-
-    message = result.choices[0].message
+results = run_reviews(
+    FINDINGS, build_messages,
+    model=MODEL,
+    response_format=AuditResponse,
+    max_in_flight=MAX_IN_FLIGHT,
+    cache=ResponseCache(mode=CACHE_MODE),
+    batch=BATCH_MODE,
+)
+
+# Struct from doc:
+# result = client.chat.completions.create(
+#     model=MODEL,
+#     messages=messages,
+#     text={
+#         "format": {
+#             "type": "json_schema",
+#             "schema": AuditResponse.model_json_schema(),
+#             "strict": True
+#         }
+#     }
+# )
+
+for r in results:
+    if r.error:
+        raise r.error
 
     # ----- refusal branch --------------------------------------------
-    if message.refusal:
+    if r.refusal:
         refusals.append({
-            "finding_index": idx,
-            "reason": message.refusal,
+            "finding_index": r.index,
+            "reason": r.refusal,
         })
-        print(f"Model refused on finding {idx}: {message.refusal}")
+        print(f"Model refused on finding {r.index}: {r.refusal}")
         continue
 
     # ----- success branch --------------------------------------------
-    parsed: AuditResponse = message.parsed
+    parsed: AuditResponse = r.parsed
     fr = parsed.finding_reviews[0]
 
     all_reviews.append(fr)                      # full object
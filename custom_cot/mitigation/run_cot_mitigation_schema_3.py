@@ -1,10 +1,14 @@
 from __future__ import annotations
 
-import json, pathlib, os, time, datetime
+import json, pathlib, time, datetime, sys
 from dotenv import load_dotenv
-from openai import OpenAI
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2]))  # repo root → `common`
 from schema.mitigate_schema_3 import AuditResponse          # <- new schema
 from utils.mitigation.load_rulebook import load_rulebook_html
+from common.llm_cache import ResponseCache
+from common.prompt_prefix import with_prefix
+from utils.review_engine import run_reviews
 
 # ------------ models & paths -------------------------------------------------
 GPT_4O   = "gpt-4o-2024-08-06"
@@ -13,6 +17,9 @@ O4_MINI  = "o4-mini"
 
 # ---------- artefacts ----------
 MODEL = GPT_4_1
+MAX_IN_FLIGHT = 8                       # concurrent requests
+CACHE_MODE = "readwrite"                # "readwrite" | "replay" | "off"
+BATCH_MODE = False                      # True → offline Batch API (overnight sweeps)
 TASK_PROMPT = pathlib.Path(
     "utils/mitigation/task_prompt_reasoning.py"
 ).read_text()
@@ -37,48 +44,55 @@ def build_rule_context(checklist, chunks):
     missing = needed - chunks.keys()
     if missing:
         raise RuntimeError(f"Missing rule sections for: {', '.join(missing)}")
-    return "\n\n".join(chunks[tag] for tag in needed)
+    return "\n\n".join(chunks[tag] for tag in sorted(needed))   # sorted → byte-stable prefix
 
 RULE_CONTEXT = build_rule_context(CHECKLIST, RULE_CHUNKS)
 
 # ------------ OpenAI client --------------------------------------------------
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# static prefix, identical for every finding → provider prompt cache hits
+STATIC_PREFIX = [
+    {"role": "system", "content": TASK_PROMPT},
+    {"role": "user",   "content": RULE_CONTEXT},
+    {"role": "user",   "content": CONTRACT},
+    {"role": "user",   "content":
+        "Answer the checklist **in order** using the AuditResponse schema."},
+    {"role": "user",   "content": checklist_bullets(CHECKLIST)},
+]
+
+def build_messages(idx: int, finding: dict) -> list[dict]:
+    return with_prefix(STATIC_PREFIX,
+        {"role": "user", "content": f"Finding {idx}: {json.dumps(finding)}"})
 
 all_reviews: list[AuditResponse.FindingReview] = []
 all_adjustments, refusals = [], []
 
 start_ts = time.time()
 
-for idx, finding in enumerate(FINDINGS):
-    messages = [
-        {"role": "system", "content": TASK_PROMPT},
-        {"role": "user",   "content": RULE_CONTEXT},
-        {"role": "user",   "content": CONTRACT},
-        {"role": "user",   "content": f"Finding {idx}: {json.dumps(finding)}"},
-        {"role": "user",   "content":
-            "Answer the checklist **in order** using the AuditResponse schema."},
-        {"role": "user",   "content": checklist_bullets(CHECKLIST)},
-    ]
-
-    # --------- official Structured-Output call -----------------------
-    completion = client.beta.chat.completions.parse(
-        model=MODEL,
-        messages=messages,
-        # temperature=0.1, # gpt 4.1 only accepts default 1
-        response_format=AuditResponse,
-    )
-
-    raw = completion.choices[0].message
+# --------- official Structured-Output calls (concurrent) -------------
+results = run_reviews(
+    FINDINGS, build_messages,
+    model=MODEL,
+    response_format=AuditResponse,
+    max_in_flight=MAX_IN_FLIGHT,
+    cache=ResponseCache(mode=CACHE_MODE),
+    batch=BATCH_MODE,
+    # temperature=0.1, # gpt 4.1 only accepts default 1
+)
+
+for r in results:
+    if r.error:
+        raise r.error
 
     # ------------- refusal branch -----------------------------------
-    if getattr(raw, "refusal", None):
-        refusals.append({"finding_index": idx, "reason": raw.refusal})
-        print(f"Model refused on finding {idx}: {raw.refusal}")
+    if r.refusal:
+        refusals.append({"finding_index": r.index, "reason": r.refusal})
+        print(f"Model refused on finding {r.index}: {r.refusal}")
         continue
 
     # ------------- success branch -----------------------------------
-    fr = raw.parsed.finding_reviews[0]     # validated object
+    fr = r.parsed.finding_reviews[0]     # validated object
 
     all_reviews.append(fr)
     all_adjustments.append(fr.adjustment.model_dump())
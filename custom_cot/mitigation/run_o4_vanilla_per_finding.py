@@ -1,13 +1,20 @@
-from openai import OpenAI
 from schema.adjustment_schema import OneAdjustmentResponse, AdjustmentsResponse
-import json, pathlib, os, time, datetime
+import json, pathlib, time, datetime, sys
 from dotenv import load_dotenv
 
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2]))  # repo root → `common`
+from common.llm_cache import ResponseCache
+from common.prompt_prefix import with_prefix
+from utils.review_engine import run_reviews
+
 # ------------ models & paths -------------------------------------------------
 O4_MINI  = "o4-mini"
 
 # ---------- artefacts ----------
 MODEL = O4_MINI
+MAX_IN_FLIGHT = 8                       # concurrent requests
+CACHE_MODE = "readwrite"                # "readwrite" | "replay" | "off"
+BATCH_MODE = False                      # True → offline Batch API (overnight sweeps)
 LARGE_TASK_PROMPT  = pathlib.Path("utils/mitigation/task_prompt_large.py").read_text()
 FINDINGS = json.loads(pathlib.Path("utils/mitigation/LandManager_findings.json").read_text())
 CONTRACT = pathlib.Path("utils/mitigation/contract_with_lines.sol").read_text()
@@ -16,32 +23,38 @@ def checklist_bullets(items: list[dict]) -> str:
     """Render checklist as numbered bullets for the LLM."""
     return "\n".join(f"{q['id']} [{q['rule']}] {q['text']}" for q in items)
 
+STATIC_PREFIX = [                       # byte-identical for every finding
+    {"role": "system", "content": LARGE_TASK_PROMPT},
+    {"role": "user",   "content": CONTRACT},
+    {"role": "user",   "content":
+        "For the finding below decide the final severity and whether it must "
+        "be removed. Return JSON that matches the AdjustmentsResponse schema, "
+        "no extra keys, no reasoning."},
+]
+
+def build_messages(idx: int, finding: dict) -> list[dict]:
+    return with_prefix(STATIC_PREFIX, {"role": "user", "content": json.dumps(finding, indent=2)})
+
 # ---------- client ----------
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 all_adjustments = []
 start = time.time()
 
-for idx, finding in enumerate(FINDINGS):
-    messages = [
-        {"role": "system", "content": LARGE_TASK_PROMPT},
-        {"role": "user",   "content": CONTRACT},
-        {"role": "user",   "content":
-            "For the finding below decide the final severity and whether it must "
-            "be removed. Return JSON that matches the AdjustmentsResponse schema, "
-            "no extra keys, no reasoning."},
-        {"role": "user",   "content": json.dumps(finding, indent=2)},
-    ]
-
-    completion = client.beta.chat.completions.parse(
-        model=MODEL,
-        messages=messages,
-        response_format=OneAdjustmentResponse,
-    )
-
-    resp: OneAdjustmentResponse = completion.choices[0].message.parsed
-    all_adjustments.append(resp.adjustment)
+results = run_reviews(
+    FINDINGS, build_messages,
+    model=MODEL,
+    response_format=OneAdjustmentResponse,
+    max_in_flight=MAX_IN_FLIGHT,
+    cache=ResponseCache(mode=CACHE_MODE),
+    batch=BATCH_MODE,
+)
+
+for r in results:
+    if not r.ok:
+        raise r.error or RuntimeError(f"Model refused on finding {r.index}: {r.refusal}")
+    resp: OneAdjustmentResponse = r.parsed
+    all_adjustments.append(resp.adjustment.model_dump())
 
 
 now = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
@@ -0,0 +1,189 @@
+"""
+Concurrent finding review
+-------------------------
+• one structured-output `parse` call per finding (or per finding batch)
+• at most `max_in_flight` requests in the air, over one pooled AsyncOpenAI client
+  from `common.clients`
+• results are returned in finding-index order; refusals and errors are kept
+  per index so the runners can log / skip them exactly like the old loops
+• live calls share the model's RPM/TPM budget (`common.rate_limit`) and
+  back off on 429s, so `max_in_flight` can sit at the provider ceiling
+• an optional `ResponseCache` serves byte-identical requests from disk
+• schemas come precomputed from `common.schema_registry`, which also times
+  validating every raw JSON answer into `response_format`
+• provider prefix-cache hits (cached vs. uncached input tokens) are tallied
+  in `engine.usage`; builders should put the static prefix first
+• `batch=True` submits everything through the offline Batch API instead
+  (set OPENAI_BASE_URL to a `common.batch_stub_server` to run it locally)
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Sequence
+
+from openai import AsyncOpenAI
+from pydantic import BaseModel
+
+from common.aio import bounded_gather
+from common.batch_api import BatchRequest, run_batch
+from common.clients import aclose_all, get_async_openai, get_openai
+from common.llm_cache import ResponseCache, structured
+from common.prompt_prefix import PromptCacheUsage
+from common.rate_limit import estimate_tokens, limited_call, limiter_for
+from common import schema_registry
+
+MAX_IN_FLIGHT = 8
+
+MessageBuilder = Callable[[int, Any], list[dict]]
+
+
+@dataclass
+class ReviewResult:
+    index  : int
+    parsed : BaseModel | None = None
+    refusal: str | None = None
+    error  : BaseException | None = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.parsed is not None
+
+
+class FindingReviewEngine:
+    """Fan `build_messages(idx, item)` requests out to the model, bounded."""
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        model: str,
+        response_format: type[BaseModel],
+        build_messages: MessageBuilder,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        label: str = "finding",
+        cache: ResponseCache | None = None,
+        **completion_kwargs,
+    ):
+        self.client = client
+        self.model = model
+        self.response_format = response_format
+        self.build_messages = build_messages
+        self.max_in_flight = max_in_flight
+        self.label = label
+        self.cache = cache
+        self.usage = PromptCacheUsage()
+        self.completion_kwargs = completion_kwargs
+
+    async def _review_one(self, idx: int, item: Any) -> ReviewResult:
+        print(f"Analyzing {self.label} #{idx} …")
+        call_start = time.time()
+        request = dict(
+            model=self.model,
+            messages=self.build_messages(idx, item),
+            response_format=self.response_format,
+            **self.completion_kwargs,
+        )
+        if self.cache is not None:
+            message = await self.cache.aparse(self.client, **request)
+            self.usage.record(message.usage)
+        else:
+            completion = await limited_call(
+                self.model, lambda: self.client.chat.completions.create(
+                    **{**request, "response_format": structured(self.response_format)}),
+                tokens=estimate_tokens(request["messages"]),
+            )
+            self.usage.record(completion.usage)
+            # raises on finish_reason length / content_filter and on invalid JSON
+            message = ResponseCache.from_completion(completion, self.response_format)
+        elapsed = time.time() - call_start
+
+        if getattr(message, "refusal", None):
+            return ReviewResult(index=idx, refusal=message.refusal, elapsed=elapsed)
+        return ReviewResult(index=idx, parsed=message.parsed, elapsed=elapsed)
+
+    async def review(self, items: Sequence[Any]) -> list[ReviewResult]:
+        raw = await bounded_gather(items, self._review_one, self.max_in_flight)
+        return [
+            r if isinstance(r, ReviewResult) else ReviewResult(index=i, error=r)
+            for i, r in enumerate(raw)
+        ]
+
+
+def run_reviews(
+    items: Sequence[Any],
+    build_messages: MessageBuilder,
+    *,
+    model: str,
+    response_format: type[BaseModel],
+    max_in_flight: int = MAX_IN_FLIGHT,
+    api_key: str | None = None,
+    cache: ResponseCache | None = None,
+    batch: bool = False,
+    label: str = "finding",
+    **completion_kwargs,
+) -> list[ReviewResult]:
+    """Blocking entry point for the top-level runner scripts."""
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if cache is not None and cache.mode == "replay":
+        api_key = api_key or "replay-only"     # never used: misses raise CacheMiss
+
+    if batch:
+        return _run_reviews_batch(
+            items, build_messages, model, response_format, api_key, cache, label,
+            completion_kwargs,
+        )
+
+    schema_registry.warm(response_format)      # large schemas built once, before the fan-out
+
+    async def _main() -> list[ReviewResult]:
+        client = get_async_openai(api_key)
+        try:
+            engine = FindingReviewEngine(
+                client, model, response_format, build_messages,
+                max_in_flight=max_in_flight, label=label, cache=cache, **completion_kwargs,
+            )
+            results = await engine.review(items)
+            print(engine.usage.report())
+            print(limiter_for(model).report())
+            print(schema_registry.report())
+            return results
+        finally:
+            await aclose_all()
+
+    results = asyncio.run(_main())
+    if cache is not None:
+        print(cache.stats())
+    return results
+
+
+def _run_reviews_batch(
+    items, build_messages, model, response_format, api_key, cache, label, completion_kwargs,
+) -> list[ReviewResult]:
+    """Same results as the live path, produced by one offline batch job."""
+    requests = [
+        BatchRequest(
+            custom_id=f"{label}-{idx}",
+            model=model,
+            messages=build_messages(idx, item),
+            response_format=response_format,
+            params=completion_kwargs,
+        )
+        for idx, item in enumerate(items)
+    ]
+    messages = run_batch(get_openai(api_key), requests, cache=cache)
+
+    results: list[ReviewResult] = []
+    for idx, req in enumerate(requests):
+        message = messages[req.custom_id]
+        if isinstance(message, BaseException):
+            results.append(ReviewResult(index=idx, error=message))
+        elif message.refusal:
+            results.append(ReviewResult(index=idx, refusal=message.refusal))
+        else:
+            results.append(ReviewResult(index=idx, parsed=message.parsed))
+    if cache is not None:
+        print(cache.stats())
+    return results
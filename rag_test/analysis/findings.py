@@ -0,0 +1,79 @@
+import re
+from retrieval.bm25 import tokenize
+
+ITEM_RE = re.compile(r"^(?:[-*]|\d+[.)])\s+(.*)$")
+FUNC_RE = re.compile(r"`([A-Za-z_$][\w$]*)(?:\([^`]*\))?`")
+TITLE_RE = re.compile(r"^\*\*(.+?)\*\*|^([^:(]+)")
+NONE_RE = re.compile(r"^\W*none\b", re.I)
+DUPLICATE_JACCARD = 0.5        # title-token overlap above which two findings are one
+
+
+def parse_findings(text):
+    """Split an analysis into findings: one per top-level list item (continuation lines kept)."""
+    items, current = [], None
+    for line in text.splitlines():
+        m = ITEM_RE.match(line)
+        if m:
+            current = [m.group(1)]
+            items.append(current)
+        elif current is not None and line.strip():
+            current.append(line.rstrip())
+    findings = []
+    for lines in items:
+        body = "\n".join(lines).strip()
+        if body and not NONE_RE.match(body):
+            findings.append(body)
+    if not items and text.strip():
+        findings.append(text.strip())                        # free-form answer: keep it whole
+    return findings
+
+
+def _title(body):
+    m = TITLE_RE.match(body)
+    return (m.group(1) or m.group(2) or body).strip(" *") if m else body.split("\n")[0]
+
+
+def _same(a, b):
+    if a["functions"] and b["functions"] and not a["functions"] & b["functions"]:
+        return False
+    union = a["terms"] | b["terms"]
+    return bool(union) and len(a["terms"] & b["terms"]) / len(union) >= DUPLICATE_JACCARD
+
+
+def merge_findings(analyses):
+    """
+    De-duplicate findings across vulnerability classes. `analyses` maps
+    class → analysis text; two findings are the same when they name an
+    overlapping set of functions (or either names none) and their titles
+    share enough tokens. The longer write-up is kept and every class that
+    reported it is listed under "classes".
+    """
+    merged = []
+    for cls, text in analyses.items():
+        for body in parse_findings(text):
+            finding = {"title": _title(body), "body": body, "classes": [cls],
+                       "functions": set(FUNC_RE.findall(body))}
+            finding["terms"] = set(tokenize(finding["title"]))
+            dup = next((f for f in merged if _same(f, finding)), None)
+            if dup is None:
+                merged.append(finding)
+                continue
+            if cls not in dup["classes"]:
+                dup["classes"].append(cls)
+            dup["functions"] |= finding["functions"]
+            if len(body) > len(dup["body"]):
+                dup["title"], dup["body"], dup["terms"] = finding["title"], body, finding["terms"]
+    return merged
+
+
+def render_findings(findings, classes):
+    """Markdown body for the merged report: a per-class summary table, then each finding once."""
+    parts = ["## Summary\n\n| Class | Findings |\n|---|---|\n"]
+    for cls in classes:
+        parts.append(f"| {cls} | {sum(cls in f['classes'] for f in findings)} |\n")
+    parts.append(f"\n## Findings ({len(findings)})\n\n")
+    if not findings:
+        parts.append("No issues reported.\n")
+    for n, f in enumerate(findings, start=1):
+        parts.append(f"### {n}. {f['title']}\n\n_Classes: {', '.join(f['classes'])}_\n\n{f['body']}\n\n")
+    return "".join(parts)
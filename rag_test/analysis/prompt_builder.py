@@ -0,0 +1,74 @@
+from common.rate_limit import estimate_tokens, limited_call_sync
+
+PROMPT_TOKEN_CEILING = 12_000   # user-prompt budget; lowest-score snippets are dropped first
+
+SYSTEM_PROMPT = "You are an expert Solidity security auditor."
+AUDIT_INSTRUCTIONS = (
+    "You are a security auditor for Solidity smart contracts. "
+    "Given the overall repository summary and the following code snippets, "
+    "identify any potential vulnerabilities (e.g., reentrancy, unchecked external calls, "
+    "integer overflow, or access control issues) and explain your reasoning.\n\n"
+)
+AUDIT_REQUEST = "Provide a list of identified vulnerabilities with brief explanations."
+FOCUS_REQUEST = (
+    "Focus: {focus}.\nReport only issues of this kind. List each one as a top-level bullet "
+    "`- **<short title>** (`<function>`): <explanation>`, or answer `- None found`."
+)
+
+
+def _score(chunk):
+    return chunk.get("rerank_score", chunk.get("score", 0.0))
+
+
+def snippet(idx, chunk):
+    """One numbered snippet block, labelled with its chunk type and name."""
+    meta = chunk["metadata"]
+    label = f"{(meta.get('type') or 'function').replace('_', ' ').title()}: {meta.get('name')}"
+    if chunk.get("dependency_of"):
+        label += f", {chunk['relation']} of {chunk['dependency_of']}"
+    return f"Snippet {idx} ({label}):\n{chunk['document']}\n\n"
+
+
+def select_snippets(chunks, budget):
+    """Highest-scoring chunks that fit in `budget` tokens, kept in their original order."""
+    costs = [estimate_tokens(c["document"]) + 16 for c in chunks]
+    order = sorted(range(len(chunks)), key=lambda i: -_score(chunks[i]))
+    kept, used = set(), 0
+    for i in order:
+        if used + costs[i] <= budget:
+            kept.add(i)
+            used += costs[i]
+    dropped = len(chunks) - len(kept)
+    if dropped:
+        print(f"Prompt ceiling: dropped {dropped} lowest-score snippet(s)")
+    return [c for i, c in enumerate(chunks) if i in kept]
+
+
+def build_prompt(retrieved_chunks, global_summary, instructions=AUDIT_INSTRUCTIONS,
+                 request=AUDIT_REQUEST, token_ceiling=PROMPT_TOKEN_CEILING):
+    """
+    Assemble the audit prompt from a list of parts joined once. Snippets
+    that would push the prompt over `token_ceiling` are dropped, lowest
+    score (re-rank score, else retrieval score) first.
+    """
+    head = [instructions, "Global Repository Summary:\n", global_summary, "\n\n", "Code Snippets:\n"]
+    fixed = estimate_tokens("".join(head)) + estimate_tokens(request)
+    kept = select_snippets(retrieved_chunks, token_ceiling - fixed)
+    parts = head + [snippet(i, c) for i, c in enumerate(kept, start=1)] + [request]
+    return "".join(parts)
+
+
+def stream_completion(client, model, prompt, system=SYSTEM_PROMPT, **kwargs):
+    """Yield the completion text as it streams, under the shared rate limiter."""
+    messages = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": prompt},
+    ]
+    stream = limited_call_sync(
+        model,
+        lambda: client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs),
+        tokens=estimate_tokens(messages),
+    )
+    for event in stream:
+        if event.choices and event.choices[0].delta.content:
+            yield event.choices[0].delta.content
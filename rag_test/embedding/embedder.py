@@ -1,25 +1,135 @@
-import time
+import asyncio
 from dotenv import load_dotenv
 import os
-from openai import OpenAI
+import numpy as np
+from common.aio import bounded_gather
+from common.clients import aclose_all, get_async_openai, get_openai
+from common.rate_limit import estimate_tokens, limited_call, limited_call_sync
+from embedding.embedding_cache import EmbeddingCache
+from retrieval.bm25 import BM25Index
 
 load_dotenv(verbose=True)
-client = OpenAI()
-client.api_key = os.getenv("OPENAI_API_KEY")
+client = get_openai(os.getenv("OPENAI_API_KEY"))  # shared pooled client
 
-def get_embedding(text, model="text-embedding-3-large"):
-    """Call OpenAI's API to get the embedding of the text."""
-    response = client.embeddings.create(input=[text], model=model)
-    embedding = response.data[0].embedding
+EMBEDDING_MODEL = "text-embedding-3-large"
+MAX_INPUTS_PER_REQUEST = 2048         # OpenAI embeddings: inputs per call
+MAX_TOKENS_PER_REQUEST = 250_000      # below the 300k-token request cap
+MAX_IN_FLIGHT = 4                     # concurrent embedding requests
+USE_EMBEDDING_CACHE = True            # on-disk cache keyed by (model, sha256(text))
+
+_caches = {}
+
+def embedding_cache(model=EMBEDDING_MODEL):
+    """Process-wide on-disk cache for `model` (None when disabled)."""
+    if not USE_EMBEDDING_CACHE:
+        return None
+    if model not in _caches:
+        _caches[model] = EmbeddingCache(model)
+    return _caches[model]
+
+def get_embedding(text, model=EMBEDDING_MODEL):
+    """Embedding of `text` as a float32 array, from the on-disk cache or OpenAI's API."""
+    cache = embedding_cache(model)
+    if cache is not None:
+        found, _ = cache.get_many([text])
+        if found:
+            return found[0]
+    response = limited_call_sync(
+        model, lambda: client.embeddings.create(input=[text], model=model),
+        tokens=estimate_tokens(text),
+    )
+    embedding = np.asarray(response.data[0].embedding, dtype=np.float32)   # same type as a cache hit
+    if cache is not None:
+        cache.put_many([text], [embedding])
+        cache.save()
     return embedding
 
+def pack_requests(texts, max_inputs=MAX_INPUTS_PER_REQUEST, max_tokens=MAX_TOKENS_PER_REQUEST):
+    """Greedy, order-preserving split of `texts` into (start, end) request slices."""
+    slices, start, tokens = [], 0, 0
+    for i, text in enumerate(texts):
+        n = estimate_tokens(text)
+        if i > start and (i - start >= max_inputs or tokens + n > max_tokens):
+            slices.append((start, i))
+            start, tokens = i, 0
+        tokens += n
+    if start < len(texts):
+        slices.append((start, len(texts)))
+    return slices
+
+def get_embeddings(texts, model=EMBEDDING_MODEL, max_in_flight=MAX_IN_FLIGHT):
+    """
+    Embed many texts with as few requests as the model limits allow, several
+    requests in flight at once. Returns a float32 array aligned to `texts`.
+    """
+    all_texts = [t if t.strip() else " " for t in texts]     # the API rejects empty inputs
+    cache = embedding_cache(model)
+    found, missing = cache.get_many(all_texts) if cache is not None else ({}, range(len(all_texts)))
+    texts = list(dict.fromkeys(all_texts[i] for i in missing))   # each new text embedded once
+    slices = pack_requests(texts)
+
+    async def embed_slice(_, bounds):
+        start, end = bounds
+        aclient = get_async_openai(os.getenv("OPENAI_API_KEY"))
+        response = await limited_call(
+            model, lambda: aclient.embeddings.create(input=texts[start:end], model=model),
+            tokens=sum(estimate_tokens(t) for t in texts[start:end]),
+        )
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+    async def run():
+        try:
+            return await bounded_gather(slices, embed_slice, max_in_flight, return_exceptions=False)
+        finally:
+            await aclose_all()
+
+    fresh = {}
+    if slices:
+        batches = asyncio.run(run())
+        fresh = dict(zip(texts, np.asarray([e for b in batches for e in b], dtype=np.float32)))
+        if cache is not None:
+            cache.put_many(list(fresh), list(fresh.values()))
+            cache.save()
+    if cache is not None:
+        print(cache.stats())
+    if not all_texts:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.stack([found[i] if i in found else fresh[t] for i, t in enumerate(all_texts)])
+
 def index_chunks(chunks, lance_collection):
-    """For each code chunk, generate an embedding and add it to the LanceDB index."""
-    for idx, chunk in enumerate(chunks):
-        embedding = get_embedding(chunk["chunk_text"])
+    """Embed all code chunks in batched requests and add them to the LanceDB + BM25 indexes."""
+    embeddings = get_embeddings([chunk["chunk_text"] for chunk in chunks])
+    # chunks from the repository loader carry stable ids; deps are then ids too
+    doc_ids = [chunk.get("id") or f"{chunk.get('name', 'chunk')}-{idx}" for idx, chunk in enumerate(chunks)]
+    metadatas = []
+    for chunk, embedding in zip(chunks, embeddings):
         chunk["embedding"] = embedding
-        doc_id = f"{chunk.get('name', 'chunk')}-{idx}"
-        metadata = {"name": chunk.get("name"), "type": chunk.get("type")}
-        lance_collection.add(doc_id, chunk["chunk_text"], embedding, metadata)
-        time.sleep(0.2)  # Pause to avoid hitting rate limits
+        metadatas.append({"name": chunk.get("name"), "type": chunk.get("type"),
+                          "contract": chunk.get("contract"), "file": chunk.get("file"),
+                          "lines": [chunk.get("start_line"), chunk.get("end_line")],
+                          # dependency edges from chunking, as [doc_id, relation]
+                          "deps": [[dep if isinstance(dep, str) else doc_ids[dep], relation]
+                                   for dep, relation in chunk.get("deps", [])]})
+    if chunks:
+        lance_collection.add_batch(doc_ids, [c["chunk_text"] for c in chunks], embeddings, metadatas)
+    # lexical side of hybrid retrieval, built alongside the vectors;
+    # like add_batch, unchanged (doc_id, text) pairs are skipped
+    if getattr(lance_collection, "lexical", None) is None:
+        lance_collection.lexical = BM25Index()
+    lexical = lance_collection.lexical
+    for doc_id, chunk in zip(doc_ids, chunks):
+        if not lexical.unchanged(doc_id, chunk["chunk_text"]):
+            lexical.add(doc_id, chunk["chunk_text"])
     print(f"Indexed {len(chunks)} chunks.")
+
+
+def remove_chunks(doc_ids, lance_collection):
+    """Drop chunks from the vector index and its BM25 side, e.g. after their file changed."""
+    if not doc_ids:
+        return
+    lance_collection.remove(doc_ids)
+    lexical = getattr(lance_collection, "lexical", None)
+    for doc_id in doc_ids:
+        if lexical is not None and doc_id in lexical:
+            lexical.remove(doc_id)
+    print(f"Removed {len(doc_ids)} stale chunks.")
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import pathlib
+import re
+import time
+import numpy as np
+
+DEFAULT_DIR = pathlib.Path(__file__).resolve().parents[2] / ".embedding_cache"
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+INDEX_DTYPE = np.dtype([("key", "S32"), ("row", "<i8"), ("used", "<f8")])
+
+
+def text_key(text):
+    """sha256 digest (raw 32 bytes) of a chunk / query text."""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache for one embedding model, keyed by sha256(text).
+
+    Layout under `root/<model>/`:
+      vectors.bin : raw float16 (or float32) rows, append-only, read via mmap
+      index.npy   : (key, row, last_used) records, rewritten on `save()`
+      meta.json   : dim / dtype
+    When `vectors.bin` grows past `max_bytes` the least-recently-used rows
+    are dropped (file compacted to 90 % of the bound).
+    """
+
+    def __init__(self, model, root=DEFAULT_DIR, dtype=np.float16, max_bytes=DEFAULT_MAX_BYTES):
+        self.model = model
+        self.dir = pathlib.Path(root) / re.sub(r"[^\w.-]", "_", model)
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        self._mmap = None
+
+        meta = self._read_meta()
+        self.dtype = np.dtype(meta.get("dtype", np.dtype(dtype).name))
+        self.dim = meta.get("dim")
+        self._rows = {}
+        self._used = np.empty(0, dtype=np.float64)
+        index_path = self.dir / "index.npy"
+        if index_path.exists() and self.dim:
+            index = np.load(index_path)
+            self._rows = {bytes(k): int(r) for k, r in zip(index["key"], index["row"])}
+            self._used = np.zeros(len(index), dtype=np.float64)
+            self._used[index["row"]] = index["used"]
+        self._truncate_to_index()
+
+    # ------------ files -----------------------------------------------------
+    @property
+    def _vectors_path(self):
+        return self.dir / "vectors.bin"
+
+    @property
+    def _row_bytes(self):
+        return self.dim * self.dtype.itemsize
+
+    @property
+    def nbytes(self):
+        return len(self._rows) * self._row_bytes if self.dim else 0
+
+    def _read_meta(self):
+        try:
+            return json.loads((self.dir / "meta.json").read_text())
+        except FileNotFoundError:
+            return {}
+
+    def _truncate_to_index(self):
+        """Drop rows appended after the last `save()` (e.g. an interrupted run)."""
+        path = self._vectors_path
+        if path.exists() and path.stat().st_size != self.nbytes:
+            with open(path, "r+b") as f:
+                f.truncate(self.nbytes)
+
+    def _matrix(self):
+        if self._mmap is None or len(self._mmap) != len(self._rows):
+            self._mmap = np.memmap(self._vectors_path, dtype=self.dtype, mode="r",
+                                   shape=(len(self._rows), self.dim))
+        return self._mmap
+
+    # ------------ lookup / insert -------------------------------------------
+    def get_many(self, texts):
+        """→ (float32 rows for the hits, list of indices into `texts` that missed)."""
+        keys = [text_key(t) for t in texts]
+        rows = [self._rows.get(k) for k in keys]
+        hit_idx = [i for i, r in enumerate(rows) if r is not None]
+        missing = [i for i, r in enumerate(rows) if r is None]
+        self.hits += len(hit_idx)
+        self.misses += len(missing)
+        found = {}
+        if hit_idx:
+            hit_rows = np.array([rows[i] for i in hit_idx])
+            self._used[hit_rows] = time.time()
+            vectors = np.asarray(self._matrix()[hit_rows], dtype=np.float32)
+            found = dict(zip(hit_idx, vectors))
+        return found, missing
+
+    def put_many(self, texts, vectors):
+        vectors = np.asarray(vectors)
+        if not len(texts):
+            return
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        new = {}
+        for text, vector in zip(texts, vectors):
+            key = text_key(text)
+            if key not in self._rows and key not in new:
+                new[key] = vector
+        if not new:
+            return
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with open(self._vectors_path, "ab") as f:
+            f.write(np.asarray(list(new.values()), dtype=self.dtype).tobytes())
+        start = len(self._rows)
+        for i, key in enumerate(new):
+            self._rows[key] = start + i
+        self._used = np.concatenate([self._used, np.full(len(new), time.time())])
+        if self.nbytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        keep_rows = int(self.max_bytes * 0.9) // self._row_bytes
+        order = np.argsort(-self._used, kind="stable")[:keep_rows]
+        order.sort()                                    # keep file order for locality
+        kept = np.asarray(self._matrix()[order])
+        by_row = {r: k for k, r in self._rows.items()}
+        tmp = self._vectors_path.with_suffix(".tmp")
+        tmp.write_bytes(kept.tobytes())
+        self._mmap = None
+        os.replace(tmp, self._vectors_path)
+        self._rows = {by_row[int(r)]: i for i, r in enumerate(order)}
+        self._used = self._used[order]
+        self.save()
+
+    def save(self):
+        if not self.dim:
+            return
+        self.dir.mkdir(parents=True, exist_ok=True)
+        index = np.empty(len(self._rows), dtype=INDEX_DTYPE)
+        index["key"] = list(self._rows.keys())
+        index["row"] = list(self._rows.values())
+        index["used"] = self._used[index["row"]]
+        with open(self.dir / "index.tmp.npy", "wb") as f:
+            np.save(f, index)
+        os.replace(self.dir / "index.tmp.npy", self.dir / "index.npy")
+        (self.dir / "meta.json").write_text(json.dumps({"dim": self.dim, "dtype": self.dtype.name}))
+
+    def stats(self):
+        return (f"embedding cache[{self.model}] hits={self.hits} misses={self.misses} "
+                f"rows={len(self._rows)} size={self.nbytes / 2**20:.1f} MB")
@@ -1,46 +1,105 @@
-import time
+import pathlib
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))  # repo root → `common`
 from preprocessing.loader import load_ast, load_source
+from preprocessing.repo_loader import load_repository
 from chunking.chunker import chunk_contract, generate_global_invariant
 from embedding.embedder import index_chunks
 from utils.mock_lancedb import LanceDBCollection
-from retrieval.retriever import iterative_retrieval
-from analysis.auditor import analyze_vulnerabilities
+from utils.disk_index import DiskVectorIndex
+from retrieval.retriever import expand_dependencies, iterative_retrieval, plan_retrieval
+from retrieval.reranker import rerank
+from analysis.auditor import analyze_vulnerabilities, stream_vulnerabilities
+from analysis.findings import merge_findings, render_findings
 from report.reporter import generate_report
-from utils.models import GPT_4o_MINI, o3_mini
+from utils.models import o3_mini
+
+INDEX_DIR = None  # e.g. ".vector_index" → persistent mmap index reused across runs
+SOURCE_DIR = None # e.g. a Foundry/Hardhat project root → index every .sol file in it
+RERANK = True     # score retrieved chunks (cheap LLM, or locally offline) before analysis
+FAN_OUT = True    # one retrieve + analyze per vulnerability class, merged into one report
+MAX_PARALLEL_CLASSES = 4
+
+# vulnerability class → retrieval query (also the analysis focus)
+VULNERABILITY_CLASSES = {
+    "reentrancy": "reentrancy: external calls or token transfers before state updates, cross-function and read-only reentrancy",
+    "access control": "missing or incorrect access control on privileged, state-changing or initializer functions",
+    "oracle manipulation": "price oracle manipulation, stale or unchecked oracle prices and spot-price dependence",
+    "rounding / precision": "rounding errors, precision loss, division before multiplication and unsafe casts",
+    "denial of service": "denial of service: unbounded loops, gas griefing, reverting external calls and push payments",
+    "upgradeability": "upgradeability: uninitialized proxies or implementations, storage layout collisions, unprotected upgrades",
+    "unchecked external calls": "unchecked return values of low-level calls and ERC20 transfers",
+    "signature replay": "signature replay: missing nonces, chain ids or deadlines and ecrecover misuse",
+}
+
+def audit_classes(model, lance_collection, global_summary, classes=VULNERABILITY_CLASSES):
+    """
+    Fan out over vulnerability classes: one batched retrieval for every
+    class query against the shared index, then per-class dependency
+    expansion, re-ranking and analysis run concurrently.
+    Returns {class: analysis text}.
+    """
+    _, per_query = plan_retrieval(list(classes.values()), lance_collection)
+
+    def audit(item):
+        name, query = item
+        retrieved = expand_dependencies(per_query[query], lance_collection)
+        if RERANK:
+            retrieved = rerank(query, retrieved)
+        print(f"[{name}] analysing {len(retrieved)} chunk(s)")
+        return name, analyze_vulnerabilities(model, retrieved, global_summary, focus=query)
+
+    with ThreadPoolExecutor(MAX_PARALLEL_CLASSES) as pool:
+        return dict(pool.map(audit, classes.items()))
 
 def main():
-    # Stage 1: Input & Preprocessing
-    ast = load_ast("ast.json")           # your JSON AST file
-    source_code = load_source("TestContract.sol")  # your Solidity source file
     model = o3_mini
+    lance_collection = DiskVectorIndex(INDEX_DIR) if INDEX_DIR else LanceDBCollection()
+
+    if SOURCE_DIR:
+        # Stages 1–3 for a whole project: parallel chunking, import graph, batched embedding
+        graph = load_repository(SOURCE_DIR, lance_collection)
+        global_summary = graph.summary()
+    else:
+        # Stage 1: Input & Preprocessing
+        ast = load_ast("ast.json")           # your JSON AST file
+        source_code = load_source("TestContract.sol")  # your Solidity source file
+
+        # Stage 2: Chunking & Global Invariant Generation
+        chunks = chunk_contract(ast, source_code)
+        global_summary = generate_global_invariant(ast)
+        print("\nExtracted Chunks:")
+        for chunk in chunks:
+            print(f"{chunk['type']} {chunk['name']} (lines {chunk['start_line']}-{chunk['end_line']}, "
+                  f"{len(chunk['chunk_text'])} chars)")
 
-    # Stage 2: Chunking & Global Invariant Generation
-    chunks = chunk_contract(ast, source_code)
-    global_summary = generate_global_invariant(ast)
+        # Stage 3: Embedding & Indexing
+        index_chunks(chunks, lance_collection)
     print("Global Summary:")
     print(global_summary)
-    print("\nExtracted Chunks:")
-    for chunk in chunks:
-        print(f"Function {chunk['name']} (length: {len(chunk['chunk_text'])} chars)")
-    
-    # Stage 3: Embedding & Indexing
-    lance_collection = LanceDBCollection()
-    index_chunks(chunks, lance_collection)
-    
-    # Stage 4: RAG-Based Retrieval & Iterative Analysis
-    vulnerability_query = "Identify potential reentrancy vulnerabilities and missing access controls"
-    retrieved = iterative_retrieval(vulnerability_query, lance_collection, max_iterations=2)
-    
-    # Stage 5: LLM-Based Vulnerability Analysis
-    analysis_text = analyze_vulnerabilities(model, retrieved, global_summary)
-    print("\nLLM Vulnerability Analysis:")
-    print(analysis_text)
-    
-    # Stage 6: Report Generation
-    report = generate_report(analysis_text)
-    with open(f"vulnerability_audit_report_{model}.md", "w") as f:
-        f.write(report)
-    print("\nAudit report generated: vulnerability_audit_report.md")
+
+    report_path = f"vulnerability_audit_report_{model}.md"
+    if FAN_OUT:
+        # Stage 4 + 5: per-class retrieval & analysis, findings de-duplicated
+        analyses = audit_classes(model, lance_collection, global_summary)
+        findings = merge_findings(analyses)
+        print(f"\n{len(findings)} unique finding(s) across {len(analyses)} classes")
+        # Stage 6: Report Generation
+        generate_report(render_findings(findings, list(analyses)), path=report_path)
+    else:
+        # Stage 4: RAG-Based Retrieval & Iterative Analysis
+        vulnerability_query = "Identify potential reentrancy vulnerabilities and missing access controls"
+        retrieved = iterative_retrieval(vulnerability_query, lance_collection)
+        if RERANK:
+            retrieved = rerank(vulnerability_query, retrieved)
+
+        # Stage 5 + 6: LLM-Based Vulnerability Analysis, streamed into the report
+        print("\nLLM Vulnerability Analysis:")
+        analysis = stream_vulnerabilities(model, retrieved, global_summary)
+        generate_report(analysis, path=report_path, echo=True)
+    print(f"\nAudit report generated: {report_path}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,209 @@
+import os
+import posixpath
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from chunking.chunker import chunk_contract
+
+SOURCE_SUFFIX = ".sol"
+SKIP_DIRS = {".git", "node_modules", "lib", "out", "cache", "artifacts", "build",
+             "typechain", "typechain-types", "coverage"}     # deps + build output
+EMBED_BATCH_CHUNKS = 256         # chunks handed to the embedder at once
+EMBED_BATCH_CHARS = 2_000_000    # … or fewer, if they are large
+MAX_PENDING_FILES = 4            # per worker: files chunked ahead of the embedder
+
+IMPORT_RE = re.compile(r"""^\s*import\s+(?:[^;"']*?\bfrom\s+)?["']([^"']+)["']""", re.M)
+
+
+def iter_sources(root):
+    """Relative paths of every Solidity file under `root`, skipping dependency/build dirs."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and not d.startswith("."))
+        for name in sorted(filenames):
+            if name.endswith(SOURCE_SUFFIX):
+                yield os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, "/")
+
+
+def read_remappings(root):
+    """`prefix=target` lines from remappings.txt, longest prefix first."""
+    path = os.path.join(root, "remappings.txt")
+    if not os.path.exists(path):
+        return []
+    pairs = []
+    with open(path) as f:
+        for line in f:
+            line = line.split(":", 1)[-1].strip()              # drop `context:` prefixes
+            if "=" in line:
+                prefix, target = line.split("=", 1)
+                pairs.append((prefix, target))
+    return sorted(pairs, key=lambda p: -len(p[0]))
+
+
+def resolve_import(root, rel, target, remappings=()):
+    """Repo-relative path `target` (imported from `rel`) points at, or None if not on disk."""
+    if target.startswith("."):
+        candidates = [posixpath.normpath(posixpath.join(posixpath.dirname(rel), target))]
+    else:
+        mapped = next((t + target[len(p):] for p, t in remappings if target.startswith(p)), None)
+        candidates = ([mapped] if mapped else []) + [target, f"lib/{target}", f"node_modules/{target}"]
+    for cand in candidates:
+        cand = posixpath.normpath(cand)
+        if os.path.isfile(os.path.join(root, cand)):
+            return cand
+    return None
+
+
+def chunk_ids(rel, chunks):
+    """
+    `file:Contract.name` per chunk, `#k` appended for overloads and other
+    repeats. No line numbers, so an edit elsewhere in the file keeps ids.
+    """
+    ids, seen = [], {}
+    for c in chunks:
+        base = f"{rel}:{c.get('contract') or ''}.{c['name']}"
+        seen[base] = seen.get(base, 0) + 1
+        ids.append(base if seen[base] == 1 else f"{base}#{seen[base]}")
+    return ids
+
+
+def id_file(doc_id):
+    """File part of a `chunk_ids` id."""
+    return doc_id.rsplit(":", 1)[0]
+
+
+def _chunk_file(root, rel):
+    """Process-pool worker: chunk one file and list its raw imports."""
+    with open(os.path.join(root, rel), encoding="utf-8", errors="replace") as f:
+        source = f.read()
+    chunks = chunk_contract({}, source)
+    ids = chunk_ids(rel, chunks)
+    for chunk, doc_id in zip(chunks, ids):
+        chunk["id"] = doc_id
+        chunk["file"] = rel
+        chunk["deps"] = [(ids[j], relation) for j, relation in chunk.get("deps", [])]
+    return rel, chunks, IMPORT_RE.findall(source)
+
+
+class ProjectGraph:
+    """File-level import graph of a Solidity project, plus what each file defines."""
+
+    def __init__(self):
+        self.imports = {}        # file → [imported repo-relative files]
+        self.unresolved = {}     # file → [import strings not found on disk]
+        self.contracts = {}      # file → [contract / library / interface names]
+
+    def add(self, rel, imports, unresolved, contracts):
+        self.imports[rel] = imports
+        self.unresolved[rel] = unresolved
+        self.contracts[rel] = contracts
+
+    def external(self):
+        """Imported files that were not indexed (e.g. under lib/ or node_modules/)."""
+        return sorted({i for deps in self.imports.values() for i in deps if i not in self.imports})
+
+    def dependencies(self, rel):
+        """Every file `rel` imports, directly or transitively."""
+        seen, stack = set(), list(self.imports.get(rel, []))
+        while stack:
+            dep = stack.pop()
+            if dep not in seen:
+                seen.add(dep)
+                stack.extend(self.imports.get(dep, []))
+        return seen
+
+    def importers(self, rel):
+        return sorted(f for f, deps in self.imports.items() if rel in deps)
+
+    def order(self):
+        """Indexed files with dependencies before dependants (cycles broken arbitrarily)."""
+        done, out = set(), []
+
+        def visit(rel, path):
+            if rel in done or rel in path or rel not in self.imports:
+                return
+            path.add(rel)
+            for dep in self.imports[rel]:
+                visit(dep, path)
+            path.discard(rel)
+            done.add(rel)
+            out.append(rel)
+
+        for rel in self.imports:
+            visit(rel, set())
+        return out
+
+    def summary(self):
+        """Global summary of the project for the audit prompt."""
+        lines = [f"This repository contains {len(self.imports)} Solidity files:"]
+        for rel in self.order():
+            names = ", ".join(self.contracts[rel]) or "no contracts"
+            deps = [d for d in self.imports[rel] if d in self.imports]
+            lines.append(f"- {rel}: {names}" + (f" (imports {', '.join(deps)})" if deps else ""))
+        return "\n".join(lines)
+
+
+def iter_chunked_files(root, files, workers=None):
+    """
+    Chunk `files` in a process pool, yielding (rel, chunks, imports) in
+    order. At most MAX_PENDING_FILES × workers files are in flight, so a
+    slow consumer (the embedder) bounds how far chunking runs ahead.
+    """
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for rel in files:
+            pending.append(pool.submit(_chunk_file, root, rel))
+            if len(pending) >= workers * MAX_PENDING_FILES:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def load_repository(root, lance_collection, workers=None,
+                    batch_chunks=EMBED_BATCH_CHUNKS, batch_chars=EMBED_BATCH_CHARS):
+    """
+    Index a whole Solidity project: walk `root`, chunk files in parallel,
+    resolve their imports into a `ProjectGraph` and embed chunks in
+    bounded batches as they arrive, so memory is capped by the batch size
+    rather than the repository size. Chunk ids are `file:Contract.name`, so
+    re-indexing into a `DiskVectorIndex` skips unchanged chunks; ids a file
+    no longer produces, and chunks of files gone from the tree, are removed.
+    """
+    from embedding.embedder import index_chunks, remove_chunks
+
+    root = os.path.abspath(root)
+    remappings = read_remappings(root)
+    graph = ProjectGraph()
+    files = list(iter_sources(root))
+    batch, chars, total = [], 0, 0
+    stored = {}                  # file → ids already in a persistent index
+    if hasattr(lance_collection, "remove"):
+        for doc_id in lance_collection.ids:
+            stored.setdefault(id_file(doc_id), set()).add(doc_id)
+    start = time.perf_counter()
+
+    def flush():
+        nonlocal batch, chars, total
+        if batch:
+            index_chunks(batch, lance_collection)
+            total += len(batch)
+        batch, chars = [], 0
+
+    for rel, chunks, imports in iter_chunked_files(root, files, workers):
+        resolved = [resolve_import(root, rel, target, remappings) for target in imports]
+        graph.add(rel, list(dict.fromkeys(r for r in resolved if r)),
+                  [t for t, r in zip(imports, resolved) if not r],
+                  [c["name"] for c in chunks if c["type"] in ("contract_header", "interface")])
+        remove_chunks(sorted(stored.pop(rel, set()) - {c["id"] for c in chunks}), lance_collection)
+        for chunk in chunks:
+            batch.append(chunk)
+            chars += len(chunk["chunk_text"])
+            if len(batch) >= batch_chunks or chars >= batch_chars:
+                flush()
+    flush()
+    remove_chunks(sorted(i for ids in stored.values() for i in ids), lance_collection)
+    print(f"Loaded {len(files)} files → {total} chunks in {time.perf_counter() - start:.1f}s "
+          f"({len(graph.external())} external imports, "
+          f"{sum(map(len, graph.unresolved.values()))} unresolved)")
+    return graph
@@ -1,41 +1,18 @@
 import os
 import json
 import re
-import time
-from openai import OpenAI
+import sys
+import pathlib
 from dotenv import load_dotenv
 
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))  # repo root → `common`
+from common.clients import get_openai
+from common.rate_limit import estimate_tokens, limited_call_sync
+from utils.mock_lancedb import LanceDBCollection
+
 # Load environment variables
 load_dotenv(verbose=True)
-client = OpenAI()
-client.api_key = os.getenv("OPENAI_API_KEY")
-
-# Hypothetical LanceDB client (replace with your actual LanceDB client)
-class LanceDBCollection:
-    def __init__(self):
-        self.index = {}
-    
-    def add(self, doc_id, document, embedding, metadata):
-        self.index[doc_id] = {
-            "document": document,
-            "embedding": embedding,
-            "metadata": metadata
-        }
-    
-    def query(self, query_embedding, top_k=3):
-        from numpy import dot
-        from numpy.linalg import norm
-        import numpy as np
-        
-        def cosine_sim(a, b):
-            return dot(a, b) / (norm(a) * norm(b) + 1e-10)
-        
-        results = []
-        for doc_id, item in self.index.items():
-            sim = cosine_sim(np.array(query_embedding), np.array(item["embedding"]))
-            results.append((doc_id, sim, item))
-        results.sort(key=lambda x: x[1], reverse=True)
-        return results[:top_k]
+client = get_openai(os.getenv("OPENAI_API_KEY"))  # shared pooled client
 
 # Instantiate a simple in-memory LanceDB collection
 lance_collection = LanceDBCollection()
@@ -137,7 +114,10 @@ def generate_global_invariant(ast):
 
 def get_embedding(text, model="text-embedding-3-large"):
     """Call OpenAI's API to get the embedding of the text."""
-    response = client.embeddings.create(input=[text], model=model)
+    response = limited_call_sync(
+        model, lambda: client.embeddings.create(input=[text], model=model),
+        tokens=estimate_tokens(text),
+    )
     embedding = response.data[0].embedding
     return embedding
 
@@ -152,7 +132,6 @@ def index_chunks(chunks):
             "type": chunk.get("type")
         }
         lance_collection.add(doc_id, chunk["chunk_text"], embedding, metadata)
-        time.sleep(0.2)  # Pause to avoid rate limits
     print(f"Indexed {len(chunks)} chunks.")
 
 ##############################
@@ -185,7 +164,6 @@ def iterative_retrieval(vulnerability_query, max_iterations=3):
         for r in results:
             if r not in all_retrieved:
                 all_retrieved.append(r)
-        time.sleep(0.5)
     return all_retrieved
 
 ##############################
@@ -208,14 +186,15 @@ def analyze_vulnerabilities(retrieved_chunks, global_summary):
         prompt += chunk["document"] + "\n\n"
     prompt += "Provide a list of identified vulnerabilities with a brief explanation for each."
     
-    response = client.chat.completions.create(
+    messages = [
+        {"role": "system", "content": "You are an expert Solidity security auditor."},
+        {"role": "user", "content": prompt}
+    ]
+    response = limited_call_sync("gpt-4o-mini", lambda: client.chat.completions.create(
         model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "You are an expert Solidity security auditor."},
-            {"role": "user", "content": prompt}
-        ],
+        messages=messages,
         temperature=0.2
-    )
+    ), tokens=estimate_tokens(messages))
     analysis = response.choices[0].message.content
     return str(analysis)
 
@@ -1,7 +1,28 @@
-def generate_report(analysis_text):
+REPORT_TITLE = "# Solidity Contract Vulnerability Audit Report\n\n"
+
+def generate_report(analysis, path=None, echo=False):
     """
     Format the vulnerability analysis as a Markdown audit report.
+    `analysis` is the full text or an iterable of streamed text pieces;
+    with `path` every piece is appended and flushed as it arrives, and
+    `echo` prints it too. The complete report is returned either way.
     """
-    report = "# Solidity Contract Vulnerability Audit Report\n\n"
-    report += analysis_text
-    return report
+    pieces = [analysis] if isinstance(analysis, str) else analysis
+    parts = [REPORT_TITLE]
+    f = open(path, "w") if path else None
+    try:
+        if f:
+            f.write(REPORT_TITLE)
+        for piece in pieces:
+            parts.append(piece)
+            if f:
+                f.write(piece)
+                f.flush()
+            if echo:
+                print(piece, end="", flush=True)
+    finally:
+        if f:
+            f.close()
+    if echo:
+        print()
+    return "".join(parts)
@@ -0,0 +1,129 @@
+import hashlib
+import math
+import re
+from collections import Counter, defaultdict
+import numpy as np
+
+IDENT_RE = re.compile(r"[A-Za-z_$][A-Za-z0-9_$]*|\d+")
+CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z]|\d|\b)|[A-Z]?[a-z]+|[A-Z]+|\d+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from in into is it of on or that the this to with "
+    "any all identify potential".split()
+)
+
+
+def tokenize(text):
+    """
+    Solidity-aware tokens: every identifier is kept whole (lower-cased,
+    leading underscores stripped) and also split on camelCase / underscores,
+    so `_updateFunding` matches "updateFunding", "update" and "funding".
+    """
+    tokens = []
+    for ident in IDENT_RE.findall(text):
+        whole = ident.strip("_$").lower()
+        if not whole or whole in STOPWORDS:
+            continue
+        tokens.append(whole)
+        parts = [p.lower() for piece in ident.split("_") for p in CAMEL_RE.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p not in STOPWORDS)
+    return tokens
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class BM25Index:
+    """
+    Incremental inverted index scored with Okapi BM25. A forward index
+    (doc → its terms) lets `remove` touch only that doc's postings, and
+    freed slots are reused; re-adding a doc with unchanged text is a no-op.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids = []
+        self.doc_len = []
+        self.postings = defaultdict(dict)     # term → {doc: tf}
+        self._terms = []                      # doc → [term, …] (forward index)
+        self._digest = []                     # doc → hash of its text
+        self._slot = {}
+        self._free = []
+
+    def __len__(self):
+        return len(self._slot)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._slot
+
+    def unchanged(self, doc_id, text):
+        """True if `doc_id` is indexed with exactly this text."""
+        doc = self._slot.get(doc_id)
+        return doc is not None and self._digest[doc] == _digest(text)
+
+    def add(self, doc_id, text):
+        if self.unchanged(doc_id, text):
+            return                            # same text: nothing to re-index
+        if doc_id in self._slot:
+            self.remove(doc_id)
+        digest = _digest(text)
+        terms = Counter(tokenize(text))
+        if self._free:
+            doc = self._free.pop()
+            self.doc_ids[doc], self.doc_len[doc] = doc_id, sum(terms.values())
+            self._terms[doc], self._digest[doc] = list(terms), digest
+        else:
+            doc = len(self.doc_ids)
+            self.doc_ids.append(doc_id)
+            self.doc_len.append(sum(terms.values()))
+            self._terms.append(list(terms))
+            self._digest.append(digest)
+        self._slot[doc_id] = doc
+        for term, tf in terms.items():
+            self.postings[term][doc] = tf
+
+    def remove(self, doc_id):
+        doc = self._slot.pop(doc_id)
+        for term in self._terms[doc]:
+            posting = self.postings[term]
+            del posting[doc]
+            if not posting:
+                del self.postings[term]
+        self.doc_ids[doc] = None
+        self.doc_len[doc] = 0
+        self._terms[doc], self._digest[doc] = [], None
+        self._free.append(doc)
+
+    def scores(self, query):
+        lengths = np.asarray(self.doc_len, dtype=np.float32)
+        live = len(self._slot)
+        avg = lengths.sum() / max(live, 1)
+        out = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (live - len(posting) + 0.5) / (len(posting) + 0.5))
+            docs = np.fromiter(posting.keys(), dtype=np.int64, count=len(posting))
+            tf = np.fromiter(posting.values(), dtype=np.float32, count=len(posting))
+            norm = self.k1 * (1 - self.b + self.b * lengths[docs] / max(avg, 1e-9))
+            out[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return out
+
+    def query(self, query, top_k=10):
+        """[(doc_id, bm25 score), …] best first; docs without any term match are skipped."""
+        scores = self.scores(query)
+        hits = np.flatnonzero(scores > 0)
+        best = hits[np.argsort(-scores[hits], kind="stable")[:top_k]]
+        return [(self.doc_ids[i], float(scores[i])) for i in best]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse several best-first doc_id lists: score = Σ 1 / (k + rank)."""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda kv: -kv[1])
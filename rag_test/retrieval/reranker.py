@@ -0,0 +1,125 @@
+import json
+import os
+import re
+from collections import Counter
+import numpy as np
+from common.clients import get_openai
+from common.rate_limit import estimate_tokens, limited_call_sync
+from retrieval.bm25 import tokenize
+from utils.models import GPT_4o_MINI
+
+RERANK_MODEL = GPT_4o_MINI      # cheap model: one call scores every candidate
+RERANK_TOP_N = 6                # snippets handed to the auditor
+RERANK_BUDGET = 6000            # tokens of snippets handed to the auditor
+SNIPPET_CHARS = 1200            # per-candidate excerpt shown to the re-ranker
+
+# structural signals an auditor would look at first, with their weights
+RISK_PATTERNS = [
+    (re.compile(r"\.(?:call|delegatecall|staticcall)\s*[({]"), 0.30),
+    (re.compile(r"\.(?:transfer|send|safeTransfer|safeTransferFrom)\s*\("), 0.20),
+    (re.compile(r"\b(?:selfdestruct|tx\.origin|block\.timestamp|ecrecover)\b"), 0.20),
+    (re.compile(r"\bunchecked\s*\{|\bassembly\s*\{"), 0.15),
+    (re.compile(r"\b(?:external|public)\b(?![^{]*\b(?:view|pure)\b)"), 0.15),
+    (re.compile(r"\b(?:onlyOwner|only\w+|require|revert)\b"), 0.05),
+]
+TYPE_WEIGHT = {"function": 1.0, "modifier": 0.9, "state_vars": 0.7, "contract_header": 0.5}
+
+
+# ------------ offline scorer --------------------------------------------------
+def local_scores(query, chunks):
+    """
+    Lexical + structural relevance in [0, ~1.5] without any API: cosine of
+    Solidity-aware token counts against the query, plus weighted risky
+    constructs, scaled by how useful the chunk type is to an auditor.
+    """
+    q = Counter(tokenize(query))
+    q_norm = np.sqrt(sum(v * v for v in q.values())) or 1.0
+    scores = []
+    for chunk in chunks:
+        doc = Counter(tokenize(chunk["document"]))
+        d_norm = np.sqrt(sum(v * v for v in doc.values())) or 1.0
+        lexical = sum(q[t] * doc[t] for t in q) / (q_norm * d_norm)
+        structural = sum(w for pattern, w in RISK_PATTERNS if pattern.search(chunk["document"]))
+        weight = TYPE_WEIGHT.get(chunk["metadata"].get("type"), 0.8)
+        scores.append(weight * (lexical + structural))
+    return scores
+
+
+# ------------ LLM scorer ------------------------------------------------------
+def llm_scores(query, chunks, model=RERANK_MODEL):
+    """Score every candidate 0–10 in one JSON-mode call; returns None if unusable."""
+    listing = "\n\n".join(
+        f"[{i}] {c['metadata'].get('type', 'chunk')} {c['metadata'].get('name')}\n"
+        f"{c['document'][:SNIPPET_CHARS]}"
+        for i, c in enumerate(chunks)
+    )
+    messages = [
+        {"role": "system", "content": "You rank Solidity code snippets for a security audit."},
+        {"role": "user", "content": (
+            f"Audit focus: {query}\n\n"
+            "Rate how likely each snippet is needed to find or confirm an issue of "
+            "that kind (0 = irrelevant, 10 = essential). Answer with JSON "
+            '{"scores": [{"id": <int>, "score": <0-10>}, ...]} covering every id.\n\n'
+            + listing
+        )},
+    ]
+    client = get_openai(os.getenv("OPENAI_API_KEY"))
+    response = limited_call_sync(
+        model,
+        lambda: client.chat.completions.create(
+            model=model, messages=messages, temperature=0,
+            response_format={"type": "json_object"},
+        ),
+        tokens=estimate_tokens(messages, max_output=16 * len(chunks)),
+    )
+    try:
+        rated = json.loads(response.choices[0].message.content)["scores"]
+        by_id = {int(r["id"]): float(r["score"]) for r in rated}
+    except (ValueError, KeyError, TypeError):
+        return None
+    if len(by_id.keys() & set(range(len(chunks)))) < len(chunks):
+        return None
+    return [by_id[i] / 10 for i in range(len(chunks))]
+
+
+# ------------ selection -------------------------------------------------------
+def rerank(query, chunks, top_n=RERANK_TOP_N, token_budget=RERANK_BUDGET, use_llm=None):
+    """
+    Re-order retrieved chunks for `query` and keep the best `top_n` that fit
+    in `token_budget`. Dependency chunks added by `expand_dependencies`
+    are not ranked themselves: they follow a kept parent while budget
+    remains. The LLM scorer is used when an API key is set (or
+    `use_llm=True`) and falls back to `local_scores` on any failure.
+    """
+    primary = [c for c in chunks if "dependency_of" not in c]
+    if not primary:
+        return chunks
+    if use_llm is None:
+        use_llm = bool(os.getenv("OPENAI_API_KEY"))
+    scores = None
+    if use_llm:
+        try:
+            scores = llm_scores(query, primary)
+        except Exception as e:
+            print(f"LLM re-ranking failed ({e!r}); using the local scorer")
+    source = "llm" if scores is not None else "local"
+    if scores is None:
+        scores = local_scores(query, primary)
+
+    kept, used = [], 0
+    for i in np.argsort(-np.asarray(scores), kind="stable"):
+        chunk = primary[i]
+        cost = estimate_tokens(chunk["document"])
+        if len(kept) >= top_n or used + cost > token_budget:
+            continue
+        kept.append({**chunk, "rerank_score": float(scores[i])})
+        used += cost
+    kept_ids = {c["doc_id"] for c in kept}
+    for chunk in chunks:
+        if chunk.get("dependency_of") in kept_ids:
+            cost = estimate_tokens(chunk["document"])
+            if used + cost <= token_budget:
+                kept.append(chunk)
+                used += cost
+    print(f"Re-ranked {len(primary)} candidate(s) ({source}): kept {len(kept)}, ~{used} tokens")
+    return kept
@@ -1,36 +1,133 @@
-import time
-from embedding.embedder import get_embedding
+import numpy as np
+from common.rate_limit import estimate_tokens
+from embedding.embedder import get_embedding, get_embeddings
+from retrieval.bm25 import reciprocal_rank_fusion
+
+HYBRID = True           # fuse BM25 with vector scores when a lexical index exists
+CANDIDATES = 4          # each ranker contributes top_k * CANDIDATES before fusion
+MMR_LAMBDA = 0.7        # 1.0 → pure relevance, lower → more diverse snippets
+EXPAND_DEPS = True      # pull in direct dependencies of the retrieved chunks
+EXPANSION_BUDGET = 2000 # tokens of dependency context added on top of the retrieval
+RELATION_ORDER = {"modifier": 0, "callee": 1, "state": 2}
+
+def _rank(query_text, dense, lance_collection, top_k):
+    """One query's best-first [(doc_id, score, item)], BM25-fused when available."""
+    lexical = getattr(lance_collection, "lexical", None)
+    if not HYBRID or lexical is None:
+        return dense[:top_k]
+    sparse = lexical.query(query_text, top_k=top_k * CANDIDATES)
+    items = {doc_id: item for doc_id, _, item in dense}
+    fused = reciprocal_rank_fusion([[d for d, _, _ in dense], [d for d, _ in sparse]])[:top_k]
+    return [(doc_id, score, items.get(doc_id) or lance_collection.get(doc_id)) for doc_id, score in fused]
+
+def _as_chunk(doc_id, score, item, **extra):
+    return {"doc_id": doc_id, "score": score, "document": item["document"],
+            "metadata": item["metadata"], **extra}
 
 def query_chunks(query_text, lance_collection, top_k=5):
-    """Retrieve code chunks relevant to the query using semantic search."""
+    """
+    Retrieve code chunks relevant to the query: semantic search, fused with
+    BM25 over a Solidity-aware tokenizer via reciprocal rank fusion.
+    """
     query_embedding = get_embedding(query_text)
-    results = lance_collection.query(query_embedding, top_k=top_k)
-    retrieved_chunks = []
-    for doc_id, score, item in results:
-        retrieved_chunks.append({
-            "doc_id": doc_id,
-            "score": score,
-            "document": item["document"],
-            "metadata": item["metadata"]
-        })
-    return retrieved_chunks
-
-def iterative_retrieval(vulnerability_query, lance_collection, max_iterations=3):
-    """
-    Iteratively query the index until retrieval is comprehensive.
-    This function prints the results of each iteration.
-    """
-    all_retrieved = []
-    for i in range(max_iterations):
-        query = vulnerability_query + f" (iteration {i+1})"
-        print(f"Iteration {i+1}: querying with: {query}")
-        results = query_chunks(query, lance_collection, top_k=3)
-        for r in results:
-            if r not in all_retrieved:
-                all_retrieved.append(r)
-        # Print out the retrieved document IDs and scores for this iteration.
-        print(f"Iteration {i+1} results:")
+    dense = lance_collection.query(query_embedding, top_k=top_k * CANDIDATES)
+    return [_as_chunk(*r) for r in _rank(query_text, dense, lance_collection, top_k)]
+
+def mmr_select(query_vectors, doc_vectors, k, lam=MMR_LAMBDA):
+    """
+    Maximal marginal relevance: greedily pick docs maximising
+    lam * relevance − (1 − lam) * similarity to what is already picked,
+    where relevance is the best cosine against any of the queries.
+    """
+    relevance = (doc_vectors @ query_vectors.T).max(axis=1)
+    pairwise = doc_vectors @ doc_vectors.T
+    chosen, redundancy = [], np.full(len(doc_vectors), -np.inf)
+    for _ in range(min(k, len(doc_vectors))):
+        gain = lam * relevance - (1 - lam) * np.maximum(redundancy, 0)
+        gain[chosen] = -np.inf
+        best = int(np.argmax(gain))
+        chosen.append(best)
+        redundancy = np.maximum(redundancy, pairwise[best])
+    return chosen, relevance
+
+def plan_retrieval(queries, lance_collection, top_k=3, max_results=None, lam=MMR_LAMBDA):
+    """
+    Retrieve for several vulnerability-class queries in one round-trip: one
+    batched embedding call, one matrix product over the index, a doc_id set
+    for de-duplication and MMR to keep the merged snippets diverse. MMR
+    picks `max_results` (default top_k per query) from every query's
+    top_k * CANDIDATES hits; a chunk's score is its MMR rank mapped to
+    (0, 1], best first, and its raw cosine is kept as `relevance`.
+    Returns (merged chunks, {query: its own best-first chunks}).
+    """
+    query_vectors = get_embeddings(list(queries))
+    dense = lance_collection.query_batch(query_vectors, top_k=top_k * CANDIDATES)
+
+    per_query, seen, candidates, origin = {}, set(), [], {}
+    for query, hits in zip(queries, dense):
+        ranked = _rank(query, hits, lance_collection, top_k * CANDIDATES)
+        per_query[query] = [_as_chunk(*r) for r in ranked[:top_k]]
+        for doc_id, _, item in ranked:
+            if doc_id not in seen:
+                seen.add(doc_id)
+                candidates.append((doc_id, item))
+                origin[doc_id] = query
+    if not candidates:
+        return [], per_query
+
+    doc_vectors = lance_collection.vectors([doc_id for doc_id, _ in candidates])
+    q = query_vectors / (np.linalg.norm(query_vectors, axis=1, keepdims=True) + 1e-10)
+    k = max_results or top_k * len(queries)
+    chosen, relevance = mmr_select(q, doc_vectors, k, lam)
+    merged = [_as_chunk(candidates[i][0], 1.0 - rank / len(chosen), candidates[i][1],
+                        query=origin[candidates[i][0]], relevance=float(relevance[i]))
+              for rank, i in enumerate(chosen)]
+    return merged, per_query
+
+def expand_dependencies(chunks, lance_collection, token_budget=EXPANSION_BUDGET):
+    """
+    Add the direct dependencies recorded at chunking time (modifiers,
+    internal callees, state-variable blocks) of each retrieved chunk —
+    one hop only, best-ranked chunk first, modifiers before callees before
+    state — while they fit in `token_budget`. Added chunks carry
+    `dependency_of` and `relation`.
+    """
+    have = {c["doc_id"] for c in chunks}
+    wanted = sorted(
+        (rank, RELATION_ORDER.get(relation, len(RELATION_ORDER)), doc_id, relation, c["doc_id"])
+        for rank, c in enumerate(chunks)
+        for doc_id, relation in c["metadata"].get("deps", [])
+    )
+    added, used = [], 0
+    for _, _, doc_id, relation, parent in wanted:
+        if doc_id in have:
+            continue
+        item = lance_collection.get(doc_id)
+        cost = estimate_tokens(item["document"])
+        if used + cost > token_budget:
+            continue                                   # a smaller dependency may still fit
+        have.add(doc_id)
+        used += cost
+        added.append(_as_chunk(doc_id, 0.0, item, dependency_of=parent, relation=relation))
+    return chunks + added
+
+def iterative_retrieval(vulnerability_queries, lance_collection, top_k=3):
+    """
+    Retrieve for one query or a list of vulnerability-class queries in a
+    single batched pass, then expand the hits with their direct
+    dependencies. This function prints the results of each query.
+    """
+    if isinstance(vulnerability_queries, str):
+        vulnerability_queries = [vulnerability_queries]
+    merged, per_query = plan_retrieval(vulnerability_queries, lance_collection, top_k=top_k)
+    for query, results in per_query.items():
+        print(f"Query: {query}")
         for r in results:
             print(f"  DocID: {r['doc_id']} - Score: {r['score']:.3f}")
-        time.sleep(0.5)
-    return all_retrieved
+    print(f"{len(merged)} unique chunk(s) after de-duplication + MMR")
+    if EXPAND_DEPS:
+        merged = expand_dependencies(merged, lance_collection)
+        for r in merged:
+            if "dependency_of" in r:
+                print(f"  + {r['doc_id']} ({r['relation']} of {r['dependency_of']})")
+    return merged
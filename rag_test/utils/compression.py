@@ -0,0 +1,207 @@
+import time
+import numpy as np
+from utils.vector_store import normalize, top_k_rows
+
+
+def kmeans(vectors, k, iters=10, seed=0):
+    """Plain (Euclidean) k-means, used for the PQ sub-codebooks."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].astype(np.float32)
+    for _ in range(iters):
+        labels = np.argmax(vectors @ centroids.T - 0.5 * (centroids ** 2).sum(1), axis=1)
+        counts = np.bincount(labels, minlength=k)
+        filled = counts > 0
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.zeros_like(centroids)
+        sums[filled] = np.add.reduceat(vectors[np.argsort(labels, kind="stable")], starts[filled], axis=0)
+        centroids[filled] = sums[filled] / counts[filled, None]
+        centroids[~filled] = vectors[rng.choice(len(vectors), int((~filled).sum()))]
+    return centroids
+
+
+# ------------ codecs ----------------------------------------------------------
+class Float16Codec:
+    """Half-precision rows (2x smaller); scored in float32 blocks."""
+
+    def fit(self, matrix):
+        return self
+
+    def encode(self, matrix):
+        return np.asarray(matrix, dtype=np.float16)
+
+    def scores(self, codes, queries, block=65536):
+        out = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), block):
+            out[:, start:start + block] = queries @ codes[start:start + block].astype(np.float32).T
+        return out
+
+    def prepare(self, queries):
+        return queries
+
+
+class MatryoshkaCodec:
+    """
+    Keep the first `dim` dimensions and re-normalise. text-embedding-3 models
+    are trained so that prefixes remain usable embeddings; `inner` (e.g.
+    float16) compresses the truncated rows further.
+    """
+
+    def __init__(self, dim, inner=None):
+        self.dim = dim
+        self.inner = inner
+
+    def fit(self, matrix):
+        if self.inner is not None:
+            self.inner.fit(normalize(matrix[:, :self.dim]))
+        return self
+
+    def encode(self, matrix):
+        cut = normalize(matrix[:, :self.dim])
+        return self.inner.encode(cut) if self.inner is not None else cut
+
+    def prepare(self, queries):
+        cut = normalize(queries[:, :self.dim])
+        return self.inner.prepare(cut) if self.inner is not None else cut
+
+    def scores(self, codes, queries):
+        if self.inner is not None:
+            return self.inner.scores(codes, queries)
+        return queries @ codes.T
+
+
+class PQCodec:
+    """
+    Product quantisation: the vector is cut into `m` sub-vectors, each
+    replaced by the id of its nearest of `ksub` (≤ 256) sub-centroids, so a
+    row costs `m` bytes. Queries are scored by asymmetric distance
+    computation: one (m, ksub) inner-product table per query, then a table
+    lookup + sum per row — the query itself is never quantised.
+    """
+
+    def __init__(self, m=64, ksub=256, iters=10, train_sample=20_000):
+        self.m = m
+        self.ksub = ksub
+        self.iters = iters
+        self.train_sample = train_sample
+
+    def _split(self, x):
+        return np.array_split(x, self.m, axis=1)
+
+    def fit(self, matrix):
+        rng = np.random.default_rng(0)
+        sample = matrix
+        if len(matrix) > self.train_sample:
+            sample = matrix[np.sort(rng.choice(len(matrix), self.train_sample, replace=False))]
+        self.codebooks = [kmeans(np.asarray(sub, dtype=np.float32), self.ksub, self.iters)
+                          for sub in self._split(np.asarray(sample, dtype=np.float32))]
+        return self
+
+    def encode(self, matrix, block=65536):
+        codes = np.empty((len(matrix), self.m), dtype=np.uint8)
+        for start in range(0, len(matrix), block):
+            subs = self._split(np.asarray(matrix[start:start + block], dtype=np.float32))
+            for j, (sub, book) in enumerate(zip(subs, self.codebooks)):
+                codes[start:start + block, j] = np.argmax(sub @ book.T - 0.5 * (book ** 2).sum(1), axis=1)
+        return codes
+
+    def prepare(self, queries):
+        # (q, m, ksub) ADC lookup tables
+        return np.stack([sub @ book.T for sub, book in zip(self._split(queries), self.codebooks)], axis=1)
+
+    def scores(self, codes, tables):
+        # one `take` per sub-space over the contiguous code column
+        out = np.zeros((len(tables), len(codes)), dtype=np.float32)
+        columns = np.ascontiguousarray(codes.T)
+        for q, table in enumerate(tables):
+            for j in range(self.m):
+                out[q] += table[j].take(columns[j])
+        return out
+
+
+# ------------ index -----------------------------------------------------------
+class CompressedIndex:
+    """
+    Search over codec-compressed rows. With `rerank > 0` the best
+    `top_k * rerank` candidates are re-scored against `full` (the original
+    float32 rows — typically an np.memmap, so only candidates are paged in).
+    """
+
+    def __init__(self, codec, rerank=0):
+        self.codec = codec
+        self.rerank = rerank
+        self.size = 0
+
+    def build(self, matrix, full=None):
+        self.codes = self.codec.fit(matrix).encode(matrix)
+        self.full = full if full is not None else (matrix if self.rerank else None)
+        self.size = len(matrix)
+        return self
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+    def search(self, queries, top_k=3):
+        queries = normalize(np.atleast_2d(queries))
+        approx = self.codec.scores(self.codes, self.codec.prepare(queries))
+        if not self.rerank or self.full is None:
+            rows = top_k_rows(approx, top_k)
+            return rows, np.take_along_axis(approx, rows, axis=1)
+        cand = top_k_rows(approx, top_k * self.rerank)
+        exact = np.stack([np.asarray(self.full[c], dtype=np.float32) @ q for c, q in zip(cand, queries)])
+        best = top_k_rows(exact, top_k)
+        return np.take_along_axis(cand, best, axis=1), np.take_along_axis(exact, best, axis=1)
+
+
+# ------------ memory vs recall benchmark --------------------------------------
+def benchmark(n=50_000, dim=1024, queries=100, top_k=10):
+    from utils.ivf_index import recall_at_k
+
+    rng = np.random.default_rng(0)
+    # synthetic embeddings whose variance decays along the dimension, as in
+    # Matryoshka-trained models, so prefixes carry most of the signal
+    decay = np.exp(-np.arange(dim) / (dim / 4)).astype(np.float32)
+    centers = rng.normal(size=(500, dim)).astype(np.float32) * decay
+    data = normalize(centers[rng.integers(500, size=n)]
+                     + 0.5 * rng.normal(size=(n, dim)).astype(np.float32) * decay)
+    qs = normalize(data[rng.choice(n, queries, replace=False)]
+                   + 0.3 * rng.normal(size=(queries, dim)).astype(np.float32) * decay)
+    exact = top_k_rows(qs @ data.T, top_k)
+
+    configs = [
+        ("float32", None, 0),
+        ("float16", Float16Codec(), 0),
+        (f"matryoshka {dim // 4}", MatryoshkaCodec(dim // 4), 0),
+        (f"matryoshka {dim // 4} + f16", MatryoshkaCodec(dim // 4, Float16Codec()), 0),
+        ("pq m=128", PQCodec(m=128), 0),
+        ("pq m=64", PQCodec(m=64), 0),
+        ("pq m=128 + rerank x10", PQCodec(m=128), 10),
+        ("pq m=64 + rerank x10", PQCodec(m=64), 10),
+    ]
+    print(f"n={n} dim={dim} top_k={top_k}")
+    for name, codec, rerank in configs:
+        if codec is None:
+            start = time.perf_counter()
+            rows = top_k_rows(qs @ data.T, top_k)
+            t, nbytes = time.perf_counter() - start, data.nbytes
+        else:
+            index = CompressedIndex(codec, rerank).build(data)
+            start = time.perf_counter()
+            rows = index.search(qs, top_k)[0]
+            t = time.perf_counter() - start
+            nbytes = index.nbytes
+        print(f"  {name:<26} {nbytes / 2**20:8.1f} MB  x{data.nbytes / nbytes:5.1f}  "
+              f"recall@{top_k}={recall_at_k(rows, exact):.3f}  {t / queries * 1e3:6.2f} ms/query")
+
+
+# run from rag_test/ as a module (it imports `utils.*`): python -m utils.compression
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="memory vs recall for compressed embeddings "
+                                             "(run from rag_test/: python -m utils.compression)")
+    ap.add_argument("--n", type=int, default=50_000)
+    ap.add_argument("--dim", type=int, default=1024)
+    args = ap.parse_args()
+    benchmark(n=args.n, dim=args.dim)
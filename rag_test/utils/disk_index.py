@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import pathlib
+import numpy as np
+from retrieval.bm25 import BM25Index
+from utils.vector_store import normalize, top_k_rows
+
+
+def _digest(document, metadata):
+    """Row fingerprint over the document and its metadata (deps, lines … can change alone)."""
+    blob = json.dumps([document, metadata], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+class _Segment:
+    """One immutable, append-only batch of rows; everything but ids is lazy."""
+
+    def __init__(self, root, name, dim):
+        self.root = root
+        self.name = name
+        self.dim = dim
+        entries = json.loads((root / f"{name}.ids.json").read_text())
+        self.ids = [e[0] for e in entries]
+        self.digests = [e[1] for e in entries]
+        self.live = np.ones(len(self.ids), dtype=bool)
+        self._vectors = None
+        self._offsets = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def vectors(self):
+        if self._vectors is None:
+            self._vectors = np.memmap(self.root / f"{self.name}.vec", dtype=np.float32,
+                                      mode="r", shape=(len(self.ids), self.dim))
+        return self._vectors
+
+    @property
+    def offsets(self):
+        if self._offsets is None:
+            self._offsets = np.load(self.root / f"{self.name}.off.npy", mmap_mode="r")
+        return self._offsets
+
+    def item(self, row):
+        return next(self.items([row]))
+
+    def items(self, rows):
+        """Documents + metadata of `rows`, read through one open file."""
+        with open(self.root / f"{self.name}.docs", "rb") as f:
+            for row in rows:
+                start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+                f.seek(start)
+                yield json.loads(f.read(end - start))
+
+    def files(self):
+        return [self.root / f"{self.name}{ext}" for ext in (".vec", ".ids.json", ".docs", ".off.npy")]
+
+    @staticmethod
+    def write(root, name, doc_ids, documents, vectors, metadatas):
+        np.ascontiguousarray(vectors, dtype=np.float32).tofile(root / f"{name}.vec")
+        offsets = [0]
+        with open(root / f"{name}.docs", "wb") as f:
+            for document, meta in zip(documents, metadatas):
+                blob = json.dumps({"document": document, "metadata": meta},
+                                  ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                f.write(blob)
+                offsets.append(offsets[-1] + len(blob))
+        np.save(root / f"{name}.off.npy", np.asarray(offsets, dtype=np.int64))
+        (root / f"{name}.ids.json").write_text(json.dumps(
+            [[doc_id, _digest(document, meta)]
+             for doc_id, document, meta in zip(doc_ids, documents, metadatas)]))
+
+
+class DiskVectorIndex:
+    """
+    Persistent counterpart of `VectorStore` with the same add/query API.
+
+    Vectors (normalised float32) sit in per-segment files that are memory-
+    mapped on demand, documents + metadata in a JSON sidecar read by offset,
+    so opening an index only loads doc ids. Every `add_batch` writes a new
+    append-only segment; a newer row shadows an older one with the same
+    doc_id, and rows whose document and metadata are unchanged are skipped
+    (a metadata-only change, e.g. new deps, is rewritten). `remove()`
+    records deleted doc_ids in the manifest until `compact()` folds all
+    segments into one and drops shadowed and deleted rows. The BM25 side
+    (`lexical`) is not stored; it is rebuilt from the documents on first use.
+    """
+
+    def __init__(self, path, max_segments=16):
+        self.root = pathlib.Path(path)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_segments = max_segments
+        manifest = self._read_manifest()
+        self.dim = manifest.get("dim")
+        self._next = manifest.get("next", 1)
+        self.deleted = set(manifest.get("deleted", []))
+        self.segments = [_Segment(self.root, name, self.dim) for name in manifest.get("segments", [])]
+        self._lexical = None
+        self._rebuild_locations()
+
+    # ------------ manifest --------------------------------------------------
+    def _read_manifest(self):
+        try:
+            return json.loads((self.root / "manifest.json").read_text())
+        except FileNotFoundError:
+            return {}
+
+    def _write_manifest(self):
+        tmp = self.root / "manifest.json.tmp"
+        tmp.write_text(json.dumps({"dim": self.dim, "next": self._next,
+                                   "segments": [s.name for s in self.segments],
+                                   "deleted": sorted(self.deleted)}))
+        os.replace(tmp, self.root / "manifest.json")      # commit point
+
+    def _rebuild_locations(self):
+        """doc_id → (segment, row) of its newest copy; older and deleted copies marked dead."""
+        self._where = {}
+        for s_idx, seg in enumerate(self.segments):
+            seg.live[:] = True
+            for row, doc_id in enumerate(seg.ids):
+                old = self._where.get(doc_id)
+                if old is not None:
+                    self.segments[old[0]].live[old[1]] = False
+                self._where[doc_id] = (s_idx, row)
+        for doc_id in self.deleted:
+            where = self._where.pop(doc_id, None)
+            if where is not None:
+                self.segments[where[0]].live[where[1]] = False
+
+    def __len__(self):
+        return len(self._where)
+
+    @property
+    def ids(self):
+        """Live doc_ids."""
+        return list(self._where)
+
+    @property
+    def lexical(self):
+        """BM25 index over the live documents (None while the index is empty)."""
+        if self._lexical is None and self._where:
+            self._lexical = BM25Index()
+            for seg in self.segments:
+                rows = np.flatnonzero(seg.live)
+                for row, item in zip(rows, seg.items(rows)):
+                    self._lexical.add(seg.ids[row], item["document"])
+        return self._lexical
+
+    @lexical.setter
+    def lexical(self, index):
+        self._lexical = index
+
+    # ------------ insert ----------------------------------------------------
+    def add(self, doc_id, document, embedding, metadata):
+        self.add_batch([doc_id], [document], [embedding], [metadata])
+
+    def add_batch(self, doc_ids, documents, embeddings, metadatas):
+        vectors = normalize(np.atleast_2d(embeddings))
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"embedding dim {vectors.shape[1]} != index dim {self.dim}")
+        keep = []
+        for i, (doc_id, document, meta) in enumerate(zip(doc_ids, documents, metadatas)):
+            where = self._where.get(doc_id)
+            if where is None or self.segments[where[0]].digests[where[1]] != _digest(document, meta):
+                keep.append(i)
+        if not keep:
+            return
+        self.deleted.difference_update(doc_ids[i] for i in keep)
+        name = f"seg-{self._next:06d}"
+        self._next += 1
+        _Segment.write(self.root, name,
+                       [doc_ids[i] for i in keep], [documents[i] for i in keep],
+                       vectors[keep], [metadatas[i] for i in keep])
+        self.segments.append(_Segment(self.root, name, self.dim))
+        self._write_manifest()
+        self._rebuild_locations()
+        if len(self.segments) > self.max_segments:
+            self.compact()
+
+    def remove(self, doc_ids):
+        """Delete rows by doc_id (unknown ids are ignored); the deletion is persisted."""
+        doc_ids = [d for d in doc_ids if d in self._where]
+        if not doc_ids:
+            return
+        self.deleted.update(doc_ids)
+        self._write_manifest()
+        self._rebuild_locations()
+
+    def compact(self):
+        """Rewrite all live rows into one segment and delete the old files."""
+        if len(self.segments) <= 1 and all(s.live.all() for s in self.segments):
+            return
+        ids, docs, metas, vecs = [], [], [], []
+        for seg in self.segments:
+            rows = np.flatnonzero(seg.live)
+            for row, item in zip(rows, seg.items(rows)):
+                ids.append(seg.ids[row])
+                docs.append(item["document"])
+                metas.append(item["metadata"])
+            vecs.append(np.asarray(seg.vectors[rows]))
+        old = self.segments
+        name = f"seg-{self._next:06d}"
+        self._next += 1
+        _Segment.write(self.root, name, ids, docs,
+                       np.concatenate(vecs) if vecs else np.empty((0, self.dim)), metas)
+        self.segments = [_Segment(self.root, name, self.dim)]
+        self.deleted = set()                            # deleted rows were not copied
+        self._write_manifest()
+        for seg in old:
+            seg._vectors = None
+            for f in seg.files():
+                f.unlink(missing_ok=True)
+        self._rebuild_locations()
+
+    # ------------ search ----------------------------------------------------
+    def get(self, doc_id):
+        s_idx, row = self._where[doc_id]
+        return self.segments[s_idx].item(row)
+
+    def vectors(self, doc_ids):
+        return np.asarray([self.segments[s].vectors[r] for s, r in map(self._where.get, doc_ids)],
+                          dtype=np.float32).reshape(len(doc_ids), self.dim or 0)
+
+    def search(self, query_embeddings, top_k=3):
+        """[(segment, row, score) …] per query, best first, across all segments."""
+        queries = normalize(np.atleast_2d(query_embeddings))
+        hits = [[] for _ in range(len(queries))]
+        for seg in self.segments:
+            if not seg.live.any():
+                continue
+            scores = queries @ seg.vectors.T
+            scores[:, ~seg.live] = -np.inf
+            rows = top_k_rows(scores, top_k)
+            for q, (rs, ss) in enumerate(zip(rows, np.take_along_axis(scores, rows, axis=1))):
+                hits[q].extend((seg, int(r), float(s)) for r, s in zip(rs, ss) if s > -np.inf)
+        return [sorted(h, key=lambda x: -x[2])[:top_k] for h in hits]
+
+    def query_batch(self, query_embeddings, top_k=3):
+        return [[(seg.ids[row], score, seg.item(row)) for seg, row, score in hits]
+                for hits in self.search(query_embeddings, top_k)]
+
+    def query(self, query_embedding, top_k=3):
+        return self.query_batch([query_embedding], top_k)[0]
@@ -0,0 +1,120 @@
+import time
+import numpy as np
+from utils.vector_store import normalize, top_k_rows
+
+
+def _assign(vectors, centroids, block=65536):
+    """Nearest (max inner product) centroid per row, in bounded-memory blocks."""
+    out = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block):
+        out[start:start + block] = np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+    return out
+
+
+def spherical_kmeans(vectors, k, iters=15, sample=None, seed=0):
+    """k-means on the unit sphere (cosine), trained on a random sample."""
+    rng = np.random.default_rng(seed)
+    if sample and len(vectors) > sample:
+        vectors = vectors[np.sort(rng.choice(len(vectors), sample, replace=False))]
+    k = min(k, len(vectors))
+    centroids = np.array(vectors[rng.choice(len(vectors), k, replace=False)], dtype=np.float32)
+    for _ in range(iters):
+        labels = _assign(vectors, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=k)
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums[~empty] = np.add.reduceat(vectors[order], starts[~empty], axis=0)
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]   # re-seed empty lists
+        centroids = normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    IVF-flat approximate search over a `VectorStore` matrix.
+
+    k-means splits the (normalised) rows into `nlist` cells; each cell's rows
+    are stored contiguously, so a query scores the centroids, probes the
+    `nprobe` best cells and runs one exact product over their rows only.
+    Raising `nprobe` trades latency for recall (nprobe = nlist is exact).
+    """
+
+    def __init__(self, nlist=None, nprobe=8, iters=15, train_sample=None):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iters = iters
+        self.train_sample = train_sample
+        self.size = 0
+
+    def build(self, matrix):
+        n = len(matrix)
+        nlist = self.nlist or max(1, int(4 * np.sqrt(n)))
+        self.centroids = spherical_kmeans(matrix, nlist, self.iters,
+                                          sample=self.train_sample or 64 * nlist)
+        labels = _assign(matrix, self.centroids)
+        self.order = np.argsort(labels, kind="stable")        # row ids grouped by cell
+        self.vectors = np.ascontiguousarray(matrix[self.order])
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=len(self.centroids)))])
+        self.size = n
+        return self
+
+    def search(self, queries, top_k=3, nprobe=None):
+        """(rows, scores) like `VectorStore.search`; rows index the source matrix."""
+        queries = normalize(np.atleast_2d(queries))
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        cells = top_k_rows(queries @ self.centroids.T, nprobe)
+        k = min(top_k, self.size)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for q, probe in enumerate(cells):
+            cand = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in probe])
+            if not len(cand):
+                continue
+            s = self.vectors[cand] @ queries[q]
+            best = top_k_rows(s[None, :], k)[0]
+            rows[q, :len(best)] = self.order[cand[best]]
+            scores[q, :len(best)] = s[best]
+        return rows, scores
+
+
+# ------------ recall@k benchmark --------------------------------------------
+def recall_at_k(approx_rows, exact_rows):
+    k = exact_rows.shape[1]
+    return float(np.mean([len(set(a) & set(e)) / k for a, e in zip(approx_rows, exact_rows)]))
+
+
+def benchmark(n=200_000, dim=256, clusters=1000, queries=200, top_k=10, nprobes=(1, 4, 8, 16, 32, 64)):
+    from utils.vector_store import VectorStore
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    data = centers[rng.integers(clusters, size=n)] + 1.5 * rng.normal(size=(n, dim)).astype(np.float32)
+    qs = data[rng.choice(n, queries, replace=False)] + 1.0 * rng.normal(size=(queries, dim)).astype(np.float32)
+
+    store = VectorStore(dim=dim, capacity=n)
+    store.add_batch(range(n), [None] * n, data, [None] * n)
+    t = time.perf_counter(); exact, _ = store.search(qs, top_k); t_exact = time.perf_counter() - t
+    t = time.perf_counter(); ivf = IVFIndex().build(store.matrix); t_build = time.perf_counter() - t
+
+    print(f"n={n} dim={dim} nlist={len(ivf.centroids)} build={t_build:.1f}s "
+          f"exact={t_exact / queries * 1e3:.2f} ms/query")
+    for nprobe in nprobes:
+        t = time.perf_counter()
+        rows = np.vstack([ivf.search(q, top_k, nprobe)[0] for q in qs])
+        per_query = (time.perf_counter() - t) / queries * 1e3
+        print(f"  nprobe={nprobe:<4d} recall@{top_k}={recall_at_k(rows, exact):.3f}  {per_query:.2f} ms/query")
+
+
+# run from rag_test/ as a module (it imports `utils.*`): python -m utils.ivf_index
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="IVF-flat recall@k vs exact search "
+                                             "(run from rag_test/: python -m utils.ivf_index)")
+    ap.add_argument("--n", type=int, default=200_000)
+    ap.add_argument("--dim", type=int, default=256)
+    ap.add_argument("--k", type=int, default=10)
+    args = ap.parse_args()
+    benchmark(n=args.n, dim=args.dim, top_k=args.k)
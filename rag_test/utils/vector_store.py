@@ -0,0 +1,159 @@
+import numpy as np
+
+
+def normalize(vectors, dtype=np.float32):
+    """Row-normalise a 1-D or 2-D array (zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype=dtype)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / (norms + 1e-10)
+
+
+def top_k_rows(scores, top_k):
+    """
+    Indices of the `top_k` largest scores per row of a 2-D array, best first.
+    `argpartition` is O(n) per row; only the k survivors get sorted.
+    """
+    n = scores.shape[1]
+    k = min(top_k, n)
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+class VectorStore:
+    """
+    In-memory vector store backed by one contiguous float32 matrix.
+
+    Embeddings are L2-normalised once on insert, so a cosine query is a
+    single matrix-vector product followed by an `argpartition` top-k.
+    Rows live in a pre-allocated buffer that doubles when full (amortised
+    O(1) append). Re-adding an existing `doc_id` overwrites its row.
+    """
+
+    def __init__(self, dim=None, capacity=1024, dtype=np.float32):
+        self.dim = dim
+        self.dtype = dtype
+        self._capacity = capacity
+        self._vectors = None
+        self.size = 0
+        self.ids = []
+        self.documents = []
+        self.metadata = []
+        self._row = {}
+        self.ann = None
+        self.compressed = None
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def matrix(self):
+        """View of the live (normalised) rows, shape (size, dim)."""
+        if self._vectors is None:
+            return np.empty((0, self.dim or 0), dtype=self.dtype)
+        return self._vectors[:self.size]
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        if self._vectors is None:
+            self._vectors = np.empty((max(self._capacity, needed), self.dim), dtype=self.dtype)
+        elif needed > self._vectors.shape[0]:
+            grown = np.empty((max(needed, 2 * self._vectors.shape[0]), self.dim), dtype=self.dtype)
+            grown[:self.size] = self._vectors[:self.size]
+            self._vectors = grown
+
+    # ------------ insert ----------------------------------------------------
+    def add(self, doc_id, document, embedding, metadata):
+        self.add_batch([doc_id], [document], [embedding], [metadata])
+
+    def add_batch(self, doc_ids, documents, embeddings, metadatas):
+        vectors = normalize(np.atleast_2d(embeddings), self.dtype)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"embedding dim {vectors.shape[1]} != store dim {self.dim}")
+        self._reserve(len(doc_ids))
+        if len(doc_ids):
+            self.ann = self.compressed = None     # built over the old rows
+        for doc_id, document, vector, meta in zip(doc_ids, documents, vectors, metadatas):
+            row = self._row.get(doc_id)
+            if row is None:
+                row = self._row[doc_id] = self.size
+                self.size += 1
+                self.ids.append(doc_id)
+                self.documents.append(document)
+                self.metadata.append(meta)
+            else:
+                self.documents[row] = document
+                self.metadata[row] = meta
+            self._vectors[row] = vector
+
+    # ------------ search ----------------------------------------------------
+    def build_ann(self, nlist=None, nprobe=8):
+        """
+        Attach an IVF-flat index for large corpora. It is used while the store
+        is unchanged; any write (new row or overwritten one) drops it, so
+        search falls back to exact until `build_ann` is called again.
+        """
+        from utils.ivf_index import IVFIndex
+
+        self.ann = IVFIndex(nlist=nlist, nprobe=nprobe).build(self.matrix)
+        return self.ann
+
+    def compress(self, codec, rerank=0, spill_to=None):
+        """
+        Search over `codec`-compressed rows (see utils.compression). With
+        `spill_to` the float32 rows move to an np.memmap file, so only the
+        compressed codes stay in RAM and `rerank` pages in candidates only.
+        Like `build_ann`, any later write drops it until `compress` runs again.
+        """
+        from utils.compression import CompressedIndex
+
+        if spill_to is not None:
+            full = np.memmap(spill_to, dtype=self.dtype, mode="w+", shape=self.matrix.shape)
+            full[:] = self.matrix
+            full.flush()
+            self._vectors = full
+        self.compressed = CompressedIndex(codec, rerank).build(self.matrix, full=self.matrix)
+        return self.compressed
+
+    def item(self, row):
+        return {"document": self.documents[row], "metadata": self.metadata[row]}
+
+    def get(self, doc_id):
+        return self.item(self._row[doc_id])
+
+    def vectors(self, doc_ids):
+        """Normalised float32 rows for `doc_ids` (e.g. for MMR)."""
+        return np.asarray(self.matrix[[self._row[d] for d in doc_ids]], dtype=np.float32)
+
+    def search(self, query_embeddings, top_k=3):
+        """(rows, scores) of the best `top_k` docs for each query, best first."""
+        queries = normalize(np.atleast_2d(query_embeddings), self.dtype)
+        if self.size == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty
+        if self.ann is not None:
+            return self.ann.search(queries, top_k)
+        if self.compressed is not None:
+            return self.compressed.search(queries, top_k)
+        scores = queries @ self.matrix.T
+        rows = top_k_rows(scores, top_k)
+        return rows, np.take_along_axis(scores, rows, axis=1)
+
+    def query_batch(self, query_embeddings, top_k=3):
+        """One matrix product for many queries → one result list per query."""
+        rows, scores = self.search(query_embeddings, top_k)
+        return [
+            [(self.ids[r], float(s), self.item(r)) for r, s in zip(rs, ss) if r >= 0]
+            for rs, ss in zip(rows, scores)
+        ]
+
+    def query(self, query_embedding, top_k=3):
+        """Same contract as the old dict scan: [(doc_id, cosine, item), …]."""
+        return self.query_batch([query_embedding], top_k)[0]